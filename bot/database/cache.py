@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+def freeze(value: Any) -> Hashable:
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    return value
+
+
+class QueryCache:
+
+    def __init__(self, maxsize: int) -> None:
+        """ LRU cache of database_data results, cleared when a solve or a challenge change is detected """
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.generation = 0  # incremented on each invalidation, results computed before are not stored
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(function: Callable, args: Tuple, kwargs: Dict) -> Hashable:
+        return function.__module__, function.__name__, freeze(args), freeze(kwargs)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        if key not in self.entries:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return True, self.entries[key]
+
+    def set(self, key: Hashable, value: Any, generation: int) -> None:
+        if generation != self.generation:
+            return  # invalidated while the query was running
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        self.entries.clear()
+        self.generation += 1
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
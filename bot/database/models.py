@@ -0,0 +1,106 @@
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import JSON, Boolean, Column, DateTime, ForeignKey, Integer, MetaData, String, Table, Text
+
+
+def ctfd_2_1(metadata: MetaData) -> None:
+    """ tables used by the bot in CTFd 2.1 """
+    Table('alembic_version', metadata,
+          Column('version_num', String(32), primary_key=True))
+    Table('awards', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE')),
+          Column('team_id', Integer, ForeignKey('teams.id', ondelete='CASCADE')),
+          Column('type', String(80)),
+          Column('name', String(80)),
+          Column('description', Text),
+          Column('date', DateTime),
+          Column('value', Integer),
+          Column('category', String(80)),
+          Column('icon', Text),
+          Column('requirements', JSON))
+    Table('challenges', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('name', String(80)),
+          Column('description', Text),
+          Column('max_attempts', Integer),
+          Column('value', Integer),
+          Column('category', String(80)),
+          Column('type', String(80)),
+          Column('state', String(80), nullable=False),
+          Column('requirements', JSON))
+    Table('config', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('key', Text),
+          Column('value', Text))
+    Table('dynamic_challenge', metadata,
+          Column('id', Integer, ForeignKey('challenges.id'), primary_key=True),
+          Column('initial', Integer),
+          Column('minimum', Integer),
+          Column('decay', Integer))
+    Table('solves', metadata,
+          Column('id', Integer, ForeignKey('submissions.id', ondelete='CASCADE'), primary_key=True),
+          Column('challenge_id', Integer, ForeignKey('challenges.id', ondelete='CASCADE')),
+          Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE')),
+          Column('team_id', Integer, ForeignKey('teams.id', ondelete='CASCADE')))
+    Table('submissions', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('challenge_id', Integer, ForeignKey('challenges.id', ondelete='CASCADE')),
+          Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE')),
+          Column('team_id', Integer, ForeignKey('teams.id', ondelete='CASCADE')),
+          Column('ip', String(46)),
+          Column('provided', Text),
+          Column('type', String(32)),
+          Column('date', DateTime))
+    Table('teams', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('oauth_id', Integer, unique=True),
+          Column('name', String(128)),
+          Column('email', String(128), unique=True),
+          Column('password', String(128)),
+          Column('secret', String(128)),
+          Column('website', String(128)),
+          Column('affiliation', String(128)),
+          Column('country', String(32)),
+          Column('bracket', String(32)),
+          Column('hidden', Boolean),
+          Column('banned', Boolean),
+          Column('captain_id', Integer, ForeignKey('users.id', ondelete='SET NULL')),
+          Column('created', DateTime))
+    Table('tracking', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('type', String(32)),
+          Column('ip', String(46)),
+          Column('user_id', Integer, ForeignKey('users.id', ondelete='CASCADE')),
+          Column('date', DateTime))
+    Table('users', metadata,
+          Column('id', Integer, primary_key=True),
+          Column('oauth_id', Integer, unique=True),
+          Column('name', String(128)),
+          Column('password', String(128)),
+          Column('email', String(128), unique=True),
+          Column('type', String(80)),
+          Column('secret', String(128)),
+          Column('website', String(128)),
+          Column('affiliation', String(128)),
+          Column('country', String(32)),
+          Column('bracket', String(32)),
+          Column('hidden', Boolean),
+          Column('banned', Boolean),
+          Column('verified', Boolean),
+          Column('team_id', Integer, ForeignKey('teams.id')),
+          Column('created', DateTime))
+
+
+# alembic_version.version_num -> tables declaration, other versions are reflected
+MODELS: Dict[str, Callable[[MetaData], None]] = {
+    'b295b033364d': ctfd_2_1,
+}
+
+
+def get_metadata(version: Optional[str]) -> Optional[MetaData]:
+    if version not in MODELS:
+        return None
+    metadata = MetaData()
+    MODELS[version](metadata)
+    return metadata
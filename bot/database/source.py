@@ -0,0 +1,139 @@
+import asyncio
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from bot import log
+from bot.constants import CHANGE_FEED_CHECK, CHANGE_FEED_HEARTBEAT, POLL_BACKOFF, POLL_CLOSED_INTERVAL, \
+    POLL_INTERVAL, POLL_MAX_INTERVAL, POLL_MIN_INTERVAL
+
+
+class EventSource(ABC):
+    """ tells the cron task when the CTFd database may have changed """
+
+    def __init__(self) -> None:
+        self.events: List[Dict] = []  # events received by the last wait, empty on a timeout
+        self.period: Tuple[Optional[int], Optional[int]] = (None, None)  # start and end timestamps of the CTF
+
+    def is_closed(self, now: Optional[float] = None) -> bool:
+        """ the CTF has not started yet or is over """
+        now = time.time() if now is None else now
+        start, end = self.period
+        return (start is not None and now < start) or (end is not None and now > end)
+
+    def update(self, activity: bool) -> None:
+        """ called after each tick, activity: new solves or challenges were announced """
+
+    @abstractmethod
+    def get_interval(self, now: Optional[float] = None) -> float:
+        """ seconds until the next tick, at most """
+
+    @abstractmethod
+    async def wait(self) -> None:
+        """ returns when the next tick is due """
+
+    def close(self) -> None:
+        pass
+
+
+class PollingSource(EventSource):
+
+    def __init__(self, interval: float = POLL_INTERVAL, min_interval: float = POLL_MIN_INTERVAL,
+                 max_interval: float = POLL_MAX_INTERVAL, backoff: float = POLL_BACKOFF,
+                 closed_interval: float = POLL_CLOSED_INTERVAL) -> None:
+        """ wakes the cron task, each tick queries the database
+
+        the interval is multiplied by <backoff> after each idle tick, up to <max_interval>, and drops to
+        <min_interval> as soon as a tick finds solves or challenges
+        """
+        super().__init__()
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.closed_interval = closed_interval
+
+    def update(self, activity: bool) -> None:
+        interval = self.min_interval if activity else min(self.interval * self.backoff, self.max_interval)
+        if interval != self.interval:
+            log.debug('Polling interval', interval=interval, activity=activity)
+        self.interval = interval
+
+    def get_interval(self, now: Optional[float] = None) -> float:
+        """ seconds until the next tick """
+        now = time.time() if now is None else now
+        if not self.is_closed(now):
+            return self.interval
+        start, end = self.period
+        if start is not None and now < start:
+            # wake up on time for the first solves, the start may still be changed by the admins
+            return max(min(start - now, self.closed_interval), self.min_interval)
+        return self.closed_interval
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.get_interval())
+
+
+class ChangeFeedSource(EventSource):
+
+    def __init__(self, path: str, heartbeat: float = CHANGE_FEED_HEARTBEAT, check: float = CHANGE_FEED_CHECK) -> None:
+        """ tails a JSON lines file of row changes, written by a binlog reader or by append_event
+
+        the database is only queried when a change is received, or every <heartbeat> seconds to catch changes
+        missing from the feed (awards, bans, events lost while the feed was down)
+        """
+        super().__init__()
+        self.path = path
+        self.heartbeat = heartbeat
+        self.check = check
+        # changes made before the bot started are caught up by the watermark of db.Database
+        self.position = os.path.getsize(path) if os.path.exists(path) else 0
+
+    def read(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+        size = os.path.getsize(self.path)
+        if size < self.position:  # feed rotated or truncated
+            self.position = 0
+        if size == self.position:
+            return []
+        with open(self.path, 'rb') as f:
+            f.seek(self.position)
+            data = f.read(size - self.position)
+        end = data.rfind(b'\n') + 1  # an incomplete last line is read on the next check
+        self.position += end
+        events = []
+        for line in data[:end].splitlines():
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                log.warn('Unexpected change feed line', path=self.path, line=line[:100])
+        return events
+
+    def get_interval(self, now: Optional[float] = None) -> float:
+        return self.heartbeat
+
+    async def wait(self) -> None:
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.heartbeat
+        while loop.time() < deadline:
+            # the file is checked outside of the event loop, a slow disk must not block the discord gateway
+            self.events = await loop.run_in_executor(None, self.read)
+            if self.events:
+                return
+            await asyncio.sleep(self.check)
+        self.events = []
+
+
+def append_event(path: str, table: str, **row) -> None:
+    """ producer side of ChangeFeedSource, one line per inserted or updated row """
+    with open(path, 'a') as f:
+        f.write(json.dumps(dict(table=table, **row), default=str) + '\n')
+
+
+def get_event_source(change_feed: Optional[str] = None) -> EventSource:
+    if change_feed is None:
+        return PollingSource()
+    return ChangeFeedSource(change_feed)
@@ -1,23 +1,70 @@
-from typing import Tuple
+import hashlib
+import os
+import pickle
+from typing import Optional, Tuple
 
 import sqlalchemy
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.automap import automap_base
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, scoped_session, sessionmaker
 
+from bot import log
+from bot.constants import CTFD_MODE, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, SCHEMA_CACHE_DIR
+from bot.database.models import get_metadata
 from bot.database.tables import CTFdTables
 
 
-def get_sqlalchemy_engine(DB_URI: str) \
+def get_alembic_version(engine: sqlalchemy.engine.base.Engine) -> Optional[str]:
+    try:
+        return engine.execute(text('SELECT version_num FROM alembic_version')).scalar()
+    except SQLAlchemyError:
+        return None
+
+
+def get_reflected_metadata(engine: sqlalchemy.engine.base.Engine, DB_URI: str, version: Optional[str],
+                           cache_dir: Optional[str]) -> MetaData:
+    # reflected schemas are pickled on disk, keyed on the database and its alembic version
+    path = None
+    if cache_dir is not None and version is not None:
+        key = hashlib.sha256(f'{DB_URI} | {version}'.encode()).hexdigest()
+        path = os.path.join(cache_dir, f'{key}.pickle')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+
+    log.info('Reflecting database schema', version=version)
+    metadata = MetaData()
+    metadata.reflect(engine)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(metadata, f)
+    return metadata
+
+
+def get_sqlalchemy_engine(DB_URI: str, reflect: bool = False, cache_dir: Optional[str] = SCHEMA_CACHE_DIR) \
         -> Tuple[sqlalchemy.engine.base.OptionEngine, sqlalchemy.ext.declarative.api.DeclarativeMeta]:
-    Base = automap_base()
-    engine = create_engine(DB_URI)
+    """ reflect: map every table of the database instead of the models pinned for its alembic version """
+    connect_args, pool_args = dict(), dict(pool_pre_ping=DB_POOL_PRE_PING)
+    if DB_URI.startswith('sqlite'):
+        # sessions are used from the executor threads of db.Database
+        connect_args['check_same_thread'] = False
+    else:
+        pool_args.update(pool_size=DB_POOL_SIZE, max_overflow=0, pool_recycle=DB_POOL_RECYCLE)
+    engine = create_engine(DB_URI, connect_args=connect_args, **pool_args)
     if 'mysql' in DB_URI:
         # disable sqlalchemy caching for mysql
         engine = engine.execution_options(
             isolation_level="READ COMMITTED"
         )
-    Base.prepare(engine, reflect=True)
+
+    version = get_alembic_version(engine)
+    metadata = None if reflect else get_metadata(version)
+    if metadata is None:
+        metadata = get_reflected_metadata(engine, DB_URI, version, None if reflect else cache_dir)
+    Base = automap_base(metadata=metadata)
+    Base.prepare()
     return engine, Base
 
 
@@ -25,5 +72,12 @@ def get_sqlalchemy_session(engine: sqlalchemy.engine.base.OptionEngine) -> sqlal
     return Session(engine)
 
 
-def get_sqlalchemy_tables(base: sqlalchemy.ext.declarative.api.DeclarativeMeta) -> CTFdTables:
-    return CTFdTables(base)
+def get_sqlalchemy_scoped_session(engine: sqlalchemy.engine.base.OptionEngine) -> sqlalchemy.orm.scoping.scoped_session:
+    # one session per thread, sessions cannot be shared between executor workers
+    # sessions are removed after each operation so their identity map does not grow with the bot uptime
+    return scoped_session(sessionmaker(bind=engine))
+
+
+def get_sqlalchemy_tables(base: sqlalchemy.ext.declarative.api.DeclarativeMeta, mode: str = CTFD_MODE) \
+        -> CTFdTables:
+    return CTFdTables(base, mode=mode)
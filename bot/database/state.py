@@ -0,0 +1,31 @@
+import json
+import sqlite3
+from typing import Any, Optional
+
+
+class State:
+
+    def __init__(self, path: Optional[str] = None, namespace: Optional[str] = None) -> None:
+        """ local key/value store surviving restarts, kept in memory when path is None
+
+        keys are prefixed by "<namespace>/", a file may be shared by several CTFd instances
+        """
+        self.prefix = '' if namespace is None else f'{namespace}/'
+        self.connection = sqlite3.connect(path or ':memory:', check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        rows = self.connection.execute('SELECT key, value FROM state')
+        self.values = {key: json.loads(value) for (key, value) in rows}
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(self.prefix + key, default)
+
+    def set(self, key: str, value: Any) -> None:
+        key = self.prefix + key
+        if key in self.values and self.values[key] == value:
+            return  # nothing to write
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+        self.values[key] = value
+
+    def close(self) -> None:
+        self.connection.close()
@@ -1,3 +1,5 @@
+from sqlalchemy import select, true
+
 from bot.constants import CTFD_MODE
 
 
@@ -6,9 +8,10 @@ class CTFdError(Exception):
 
 
 def check_database(Base):
+    # tables used by the bot, see bot.database.models
     tables_name = [
-        'alembic_version', 'awards', 'challenges', 'config', 'dynamic_challenge', 'files', 'flags', 'hints',
-        'notifications', 'pages', 'solves', 'submissions', 'tags', 'teams', 'tracking', 'unlocks', 'users'
+        'alembic_version', 'awards', 'challenges', 'config', 'dynamic_challenge', 'solves', 'submissions', 'teams',
+        'tracking', 'users'
     ]
     for table_name in tables_name:
         if not hasattr(Base.classes, table_name):
@@ -17,10 +20,11 @@ def check_database(Base):
 
 class CTFdTables:
 
-    def __init__(self, Base):
+    def __init__(self, Base, mode: str = CTFD_MODE):
         check_database(Base)
+        self.mode = mode
         #  self.alembic_version = Base.classes.alembic_version
-        #  self.awards = Base.classes.awards
+        self.awards = Base.classes.awards
         self.challenges = Base.classes.challenges
         self.config = Base.classes.config
         self.dynamic_challenge = Base.classes.dynamic_challenge
@@ -32,12 +36,26 @@ class CTFdTables:
         self.solves = Base.classes.solves
         self.submissions = Base.classes.submissions
         #  self.tags = Base.classes.tags
-        #  self.teams = Base.classes.teams
+        self.teams = Base.classes.teams
         self.tracking = Base.classes.tracking
         #  self.unlocks = Base.classes.unlocks
-        if CTFD_MODE == 'users':
+        self.members = Base.classes.users  # players, members of a team in teams mode
+        # accounts ranked in the scoreboard
+        if mode == 'users':
             self.users = Base.classes.users
-        elif CTFD_MODE == 'teams':
+        elif mode == 'teams':
             self.users = Base.classes.teams
         else:
             raise CTFdError()
+
+    def account_id(self, table):
+        """ column of <table> referencing self.users: team_id in teams mode, user_id otherwise """
+        return table.team_id if self.mode == 'teams' else table.user_id
+
+    def type_filter(self, user_type: str):
+        """ condition on self.users, teams have no type and are kept when one of their members has it """
+        if user_type == 'all':
+            return true()
+        if self.mode == 'teams':
+            return self.users.id.in_(select([self.members.team_id]).where(self.members.type == user_type))
+        return self.users.type == user_type
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import discord
+
+from bot import log
+from bot.constants import EMBED_FIELDS_LIMIT, EMBED_NAME_LIMIT, EMBED_SIZE_LIMIT, MESSAGE_SIZE_LIMIT, SEND_PERIOD, \
+    SEND_RATE
+from bot.metrics import queue_depth, send_duration
+
+Message = Tuple[str, Optional[str], Optional[int]]  # content, embed name, embed color
+
+
+def fits(batch: List[Message], message: Message) -> bool:
+    content, embed_name, embed_color = message
+    if embed_name is None or embed_color is None:
+        if any(item[1] is not None and item[2] is not None for item in batch):
+            return False
+        return sum(len(item[0]) + 1 for item in batch) + len(content) <= MESSAGE_SIZE_LIMIT
+    if any(item[1] is None or item[2] != embed_color for item in batch) or len(batch) >= EMBED_FIELDS_LIMIT:
+        return False
+    return sum(len(item[0]) + len(item[1]) for item in batch) + len(content) + len(embed_name) <= EMBED_SIZE_LIMIT
+
+
+class Dispatcher:
+
+    def __init__(self) -> None:
+        """ one queue and one sender task per channel, producers never wait on discord """
+        self.queues: Dict[int, asyncio.Queue] = dict()
+        self.workers: Dict[int, asyncio.Task] = dict()
+        self.sent: Dict[int, Deque[float]] = dict()  # channel id -> dates of the last SEND_RATE messages
+
+    def put(self, channel: discord.abc.Messageable, content: str, embed_name: Optional[str] = None,
+            embed_color: Optional[int] = None) -> asyncio.Future:
+        """ returns a future done once the message is sent, True, or given up after an error, False """
+        if channel.id not in self.queues:
+            self.queues[channel.id] = asyncio.Queue()
+            self.sent[channel.id] = deque(maxlen=SEND_RATE)
+            self.workers[channel.id] = asyncio.ensure_future(self.worker(channel))
+        done = asyncio.get_event_loop().create_future()
+        self.queues[channel.id].put_nowait(((content, embed_name, embed_color), done))
+        queue_depth.set(self.queues[channel.id].qsize(), channel=channel.id)
+        return done
+
+    async def join(self) -> None:
+        for queue in list(self.queues.values()):
+            await queue.join()
+
+    async def wait(self, channel_id: int) -> None:
+        sent = self.sent[channel_id]
+        if len(sent) == sent.maxlen:
+            delay = sent[0] + SEND_PERIOD - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        sent.append(time.monotonic())
+
+    async def worker(self, channel: discord.abc.Messageable) -> None:
+        queue = self.queues[channel.id]
+        item = None
+        while True:
+            if item is None:
+                item = await queue.get()
+            batch, done, item = [item[0]], [item[1]], None
+            # pack every message already waiting into a single discord message
+            while not queue.empty():
+                candidate = queue.get_nowait()
+                if not fits(batch, candidate[0]):
+                    item = candidate
+                    break
+                batch.append(candidate[0])
+                done.append(candidate[1])
+            queue_depth.set(queue.qsize() + (item is not None), channel=channel.id)
+            await self.wait(channel.id)
+            sent = False
+            try:
+                with send_duration.time():
+                    await send(channel, batch)
+                sent = True
+            except Exception as exception:
+                log.warn('Cannot send message', channel=str(channel), error=str(exception))
+            for future in done:
+                if not future.done():
+                    future.set_result(sent)
+                queue.task_done()
+
+
+async def send(channel: discord.abc.Messageable, batch: List[Message]) -> None:
+    _, embed_name, embed_color = batch[0]
+    if embed_name is None or embed_color is None:
+        await channel.send('\n'.join(content for (content, _, _) in batch))
+        return
+    embed = discord.Embed(color=embed_color)
+    for (content, embed_name, _) in batch:
+        embed.add_field(name=embed_name[:EMBED_NAME_LIMIT], value=content, inline=False)
+    await channel.send(embed=embed)
+
+
+dispatcher = Dispatcher()
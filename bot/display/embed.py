@@ -1,3 +1,4 @@
+import asyncio
 import sys
 from html import unescape
 from typing import Dict, List, Optional
@@ -6,75 +7,86 @@ import discord
 from discord.ext import commands
 
 import bot.display.show as show
+from bot.display.dispatcher import dispatcher
 from bot import log
-from bot.constants import DB_URI, BOT_CHANNEL, CTFD_MODE, CATCH_MODE
-from bot.manage.discord_data import get_command_args, get_channel
+from bot.constants import CTFD_MODE, CATCH_MODE, EMBED_VALUE_LIMIT, MESSAGE_SIZE_LIMIT
+from bot.manage.discord_data import get_bot_channels, get_command_args, get_channels, is_bot_channel
+from bot.metrics import cache_hit_rate, cron_duration, poll_interval
+from bot.profiling import profiler
+from db import Database
 
 
 def display(part: str) -> None:
-    lines = part.split('\n')
-    for line in lines:
-        print(line)
+    log.debug('Message', lines=part.split('\n'))
 
 
 async def interrupt(channel: discord.channel.TextChannel, message: str, embed_color: Optional[int] = None,
-                    embed_name: Optional[str] = None) -> None:
-    if str(channel) != BOT_CHANNEL:  # prevent to respond if message/command is not sent from BOT_CHANNEL
-        log.warn(f'Unexpected channel != {BOT_CHANNEL}', channel=str(channel))
-        return
-    parts = show.display_parts(message)
+                    embed_name: Optional[str] = None) -> List[asyncio.Future]:
+    """ queues the message, the futures are done once its parts are sent """
+    if not is_bot_channel(channel):  # prevent to respond if message/command is not sent from a bot channel
+        log.warn(f'Unexpected channel not in {get_bot_channels()}', channel=str(channel))
+        return []
+    limit = MESSAGE_SIZE_LIMIT if embed_color is None or embed_name is None else EMBED_VALUE_LIMIT
+    parts = show.display_parts(message, limit=limit)
+    sent = []
     for part in parts:
 
         display(part)
-        if embed_color is None or embed_name is None:
-            await channel.send(part)
-        else:
-            embed = discord.Embed(color=embed_color)
-            embed.add_field(name=embed_name, value=part, inline=False)
-            await channel.send(embed=embed)
-
-
-def check(bot: commands.bot.Bot) -> Optional[discord.channel.TextChannel]:
-    channel = get_channel(bot)
-    if channel is None:
-        log.warn(f'Unexpected discord channel name', BOT_CHANNEL=BOT_CHANNEL)
-        log.warn('Please configuration in ./bot/constants.py')
-        sys.exit(0)
+        sent.append(dispatcher.put(channel, part, embed_name=embed_name, embed_color=embed_color))
+    return sent
 
-    if not bot.db.engine.table_names():
-        log.warn('Cannot connect to database', DB_URI=DB_URI)
+
+def check(bot: commands.bot.Bot) -> List[discord.channel.TextChannel]:
+    channels = get_channels(bot)
+    if not channels:
+        log.warn(f'Unexpected discord channel name', channels=get_bot_channels())
         log.warn('Please configuration in ./bot/constants.py')
         sys.exit(0)
 
+    for db in bot.databases:
+        if not db.engine.table_names():
+            log.warn('Cannot connect to database', name=db.name)
+            log.warn('Please configuration in ./bot/constants.py')
+            sys.exit(0)
+
     if CTFD_MODE not in ['users', 'teams'] or CATCH_MODE not in ['all', 'user', 'admin']:
         log.warn('Unexpected configuration', CATCH_MODE=CATCH_MODE, CTFD_MODE=CTFD_MODE)
         log.warn('Please configuration in ./bot/constants.py')
         sys.exit(0)
 
-    return channel
+    return channels
+
+
+def get_database(context: commands.context.Context) -> Database:
+    return context.bot.databases.get(context.channel)
+
+
+def update_channels(bot: commands.bot.Bot) -> None:
+    bot.channels = get_channels(bot)  # necessary from cron tasks, context.channel is used in others functions
+    log.info('Bot channels', channels=[f'{channel.guild}/{channel}' for channel in bot.channels])
 
 
 async def ready(bot: commands.bot.Bot) -> None:
-    channel = check(bot)
-    bot.channel = channel  # necessary from cron tasks, context.channel is used in others functions
+    bot.channels = check(bot)
     log.info('CTFdBot is coming !')
 
     to_send = f'Hello, it seems that it\'s the first time you are using my services.\nYou might use ' \
         f'`{bot.command_prefix}help` to know more about my features.'
 
     embed_color, embed_name = 0x000000, "CTFd Bot"
-    await interrupt(channel, to_send, embed_color=embed_color, embed_name=embed_name)
+    for channel in bot.channels:
+        await interrupt(channel, to_send, embed_color=embed_color, embed_name=embed_name)
 
 
 async def scoreboard(context: commands.context.Context, all_players=False) -> None:
-    to_send = show.display_scoreboard(context.bot.db, all_players=all_players)
+    to_send = await show.display_scoreboard(get_database(context), all_players=all_players)
     if not to_send:
         to_send = 'No users have resolved at least one challenge at this time'
     await interrupt(context.channel, to_send, embed_color=0x4200d4, embed_name='Scoreboard')
 
 
 async def categories(context: commands.context.Context) -> None:
-    to_send = show.display_categories(context.bot.db)
+    to_send = await show.display_categories(get_database(context))
     if not to_send:
         to_send = 'There is no categories of challenges at this time'
     await interrupt(context.channel, to_send, embed_color=0xB315A8, embed_name='Categories')
@@ -89,7 +101,7 @@ async def category(context: commands.context.Context) -> None:
         await interrupt(context.channel, to_send, embed_color=0xD81948, embed_name="ERROR")
         return
 
-    to_send = show.display_category(context.bot.db, category_name)
+    to_send = await show.display_category(get_database(context), category_name)
     embed_name = f"Category {category_name}"
     await interrupt(context.channel, to_send, embed_color=0xB315A8, embed_name=embed_name)
 
@@ -103,7 +115,7 @@ async def who_solved(context: commands.context.Context) -> None:
         await interrupt(context.channel, to_send, embed_color=0xD81948, embed_name="ERROR")
         return
 
-    to_send = show.display_who_solved(context.bot.db, challenge_selected)
+    to_send = await show.display_who_solved(get_database(context), challenge_selected)
     embed_name = f"Who solved {challenge_selected} ?"
     await interrupt(context.channel, to_send, embed_color=0x29C1C5, embed_name=embed_name)
 
@@ -117,7 +129,7 @@ async def problem(context: commands.context.Context) -> None:
         await interrupt(context.channel, to_send, embed_color=0xD81948, embed_name="ERROR")
         return
 
-    to_send = show.display_problem(context.bot.db, context, challenge_selected)
+    to_send = await show.display_problem(get_database(context), context, challenge_selected)
     if to_send.startswith('Ping:'):
         await interrupt(context.channel, to_send, embed_color=None, embed_name=None)
     else:
@@ -128,7 +140,7 @@ async def problem(context: commands.context.Context) -> None:
 async def display_by_blocks_duration(context: commands.context.Context, to_send_list: List[Dict[str, str]], color: int,
                                      duration_msg: str = '') -> None:
     for block in to_send_list:
-        print(block)
+        log.debug('Block', user=block['user'])
         to_send = block['msg']
 
         if block['user'] is None:
@@ -163,7 +175,7 @@ async def last_days(context: commands.context.Context) -> None:
     if len(args) == 2:
         username = unescape(args[1]).strip()
 
-    to_send_list = show.display_last_days(context.bot.db, days_num, username)
+    to_send_list = await show.display_last_days(get_database(context), days_num, username)
     await display_by_blocks_duration(context, to_send_list, 0x00C7FF, duration_msg=f'since last {hours}')
 
 
@@ -188,7 +200,7 @@ async def diff(context: commands.context.Context) -> None:
         return
 
     pseudo1, pseudo2 = args[0], args[1]
-    to_send_list = show.display_diff(context.bot.db, pseudo1, pseudo2)
+    to_send_list = await show.display_diff(get_database(context), pseudo1, pseudo2)
     await display_by_blocks_diff(context, to_send_list, 0xFF00FF)
 
 
@@ -196,11 +208,24 @@ async def flush(context: commands.context.Context) -> None:
     embed_color, embed_name = 0xD81948, 'FLUSH'
     to_send = f'{context.message.author} just launched {context.bot.command_prefix}flush command.'
     await interrupt(context.channel, to_send, embed_color=embed_color, embed_name=embed_name)
-    to_send = await show.display_flush(context)
+
+    async def progress(deleted: int) -> None:
+        await interrupt(context.channel, f'{deleted} messages deleted...', embed_color=embed_color,
+                        embed_name=embed_name)
+
+    to_send = await show.display_flush(context, progress=progress)
     await interrupt(context.channel, to_send, embed_color=embed_color, embed_name=embed_name)
 
 
-async def cron(bot: commands.bot.Bot) -> None:
-    name, to_send_cron, embed_color = await show.display_cron(bot.db)
-    if to_send_cron:
-        await interrupt(bot.channel, to_send_cron, embed_color=embed_color, embed_name=name)
+async def cron(bot: commands.bot.Bot, db: Database) -> None:
+    with cron_duration.time(instance=db.name), profiler.profile(f'cron {db.name}'):
+        to_send_cron = await show.display_cron(db)  # computed once, queued on every channel of this CTFd instance
+    channels = [channel for channel in bot.channels if is_bot_channel(channel, db.channels)]
+    sent = []
+    for name, to_send, embed_color in to_send_cron:
+        for channel in channels:
+            sent += await interrupt(channel, to_send, embed_color=embed_color, embed_name=name)
+    db.save_state_once_sent(sent)  # polling never waits on discord, a restart replays the announcements not sent yet
+    db.source.update(activity=bool(to_send_cron))
+    poll_interval.set(db.source.get_interval(), instance=db.name)
+    cache_hit_rate.set(db.cache.hit_rate, instance=db.name)
@@ -1,88 +1,99 @@
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
-import discord.utils
 from discord.ext import commands
 
 import bot.manage.channel_data as channel_data
 import bot.manage.database_data as database_data
-from bot.constants import LIMIT_SIZE, MEDALS, CATCH_MODE
+from bot.constants import EMBED_VALUE_LIMIT, MEDALS, CATCH_MODE, SCOREBOARD_RELOAD
 from bot.display.update import add_emoji
+from bot.manage.names import NameIndex
 from db import Database
 
 
-def display_parts(message: str) -> List[str]:
-    message = message.split('\n')
-    to_send = ''
-    stored = []
-    for part in message:
-        if len(to_send + part + '\n') >= LIMIT_SIZE:
-            stored.append(to_send)
-            to_send = ''
-        to_send += part + '\n'
-    stored.append(to_send)
+def display_parts(message: Union[str, Iterable[str]], limit: int = EMBED_VALUE_LIMIT) -> List[str]:
+    lines = message.split('\n') if isinstance(message, str) else message
+    stored, to_send, size = [], [], 0
+    for line in lines:
+        # lines longer than the limit are hard wrapped
+        for start in range(0, max(len(line), 1), limit - 1):
+            part = line[start:start + limit - 1] + '\n'
+            if to_send and size + len(part) > limit:
+                stored.append(''.join(to_send))
+                to_send, size = [], 0
+            to_send.append(part)
+            size += len(part)
+    stored.append(''.join(to_send))
     return stored
 
 
-def display_scoreboard(db: Database, all_players: bool = False) -> str:
-    to_send = ''
-    users_data = database_data.get_scoreboard(db.session, db.tables, user_type=CATCH_MODE)
-    if not all_players:
-        users_data = users_data[:20]
+def unknown_name(names: NameIndex, title: str, name: str) -> str:
+    to_send = f'{title} {name} does not exists.'
+    suggestions = names.suggest(name)
+    if suggestions:
+        to_send += f' Did you mean {" or ".join(suggestions)}?'
+    return to_send
+
+
+async def display_scoreboard(db: Database, all_players: bool = False) -> str:
+    to_send = []
+    users_data = db.scoreboard.get_scoreboard(limit=None if all_players else 20)
     for rank, user_data in enumerate(users_data):
         user, score = user_data['username'], user_data['score']
         if rank < len(MEDALS):
-            to_send += f'{MEDALS[rank]} {user} --> Score = {score} \n'
+            to_send.append(f'{MEDALS[rank]} {user} --> Score = {score} \n')
         else:
-            to_send += f' • • • {user} --> Score = {score} \n'
+            to_send.append(f' • • • {user} --> Score = {score} \n')
 
-    return to_send
+    return ''.join(to_send)
 
 
-def display_categories(db: Database) -> str:
-    to_send = ''
-    categories_data = database_data.get_categories(db.session, db.tables)
-    for category in categories_data:
-        to_send += f' • {category} \n'
-    return to_send
+async def display_categories(db: Database) -> str:
+    categories_data = await db.cached_query(database_data.get_categories)
+    return ''.join(f' • {category} \n' for category in categories_data)
 
 
-def display_category(db: Database, category: str) -> str:
-    category_info = database_data.get_category_info(db.session, db.tables, category)
+async def display_category(db: Database, category: str) -> str:
+    category_name = db.names['categories'].resolve(category)
+    if category_name is None:
+        return unknown_name(db.names['categories'], 'Category', category)
+    category_info = await db.cached_query(database_data.get_category_info, category_name)
     if not category_info:
-        to_send = f'Category {category} does not exists.'
-        return to_send
-
-    to_send = ''
-    for challenge in category_info:
-        to_send += f' • {challenge["name"]} ({challenge["value"]} points) \n'
-    return to_send
-
-
-def display_who_solved(db: Database, challenge_selected: str) -> str:
-    if not database_data.challenge_exists(db.session, db.tables, challenge_selected):
-        return f'Challenge {challenge_selected} does not exists.'
-    to_send = ''
-    users = database_data.get_users_solved_challenge(db.session, db.tables, challenge_selected, user_type=CATCH_MODE)
-    for user in users:
-        to_send += f' • {user}\n'
+        return f'Category {category} does not exists.'
+
+    return ''.join(f' • {challenge["name"]} ({challenge["value"]} points) \n' for challenge in category_info)
+
+
+async def display_who_solved(db: Database, challenge_selected: str) -> str:
+    challenge_name = db.names['challenges'].resolve(challenge_selected)
+    if challenge_name is None:
+        return unknown_name(db.names['challenges'], 'Challenge', challenge_selected)
+    challenge_selected = challenge_name
+    users = await db.cached_query(database_data.get_users_solved_challenge, challenge_selected, user_type=CATCH_MODE,
+                                  unkeyed=lambda: dict(users=db.scoreboard.get_users()))
+    if users is None:  # renamed or deleted since the names were loaded
+        db.names = await db.query(database_data.load_names, user_type=CATCH_MODE)
+        return unknown_name(db.names['challenges'], 'Challenge', challenge_selected)
+    to_send = ''.join(f' • {user}\n' if user not in db.team_members else
+                      f' • {user} ({", ".join(db.team_members[user])})\n' for user in users)
     if not to_send:
         to_send = f'Nobody solves {challenge_selected}.'
     return to_send
 
 
-def display_problem(db: Database, context: commands.context.Context, challenge_selected: str) -> str:
-    if not database_data.challenge_exists(db.session, db.tables, challenge_selected):
-        return f'Challenge {challenge_selected} does not exists.'
+async def display_problem(db: Database, context: commands.context.Context, challenge_selected: str) -> str:
+    challenge_name = db.names['challenges'].resolve(challenge_selected)
+    if challenge_name is None:
+        return unknown_name(db.names['challenges'], 'Challenge', challenge_selected)
+    challenge_selected = challenge_name
 
-    discord_users = database_data.get_authors_challenge(db.session, db.tables, challenge_selected)
+    discord_users = await db.cached_query(database_data.get_authors_challenge, challenge_selected)
     if not discord_users:
         to_send = f'Cannot find authors for challenge "{challenge_selected}".'
         return to_send
 
-    discord_users = [f'{user_name}#{user_id}' for (user_name, user_id) in discord_users]
-    discord_members = []
-    for discord_user in discord_users:
-        discord_members += [discord.utils.find(lambda u: discord_user == str(u), context.message.guild.members)]
+    discord_members = [context.bot.members.get(context.message.guild, f'{user_name}#{user_id}')
+                       for (user_name, user_id) in discord_users]
     discord_members = [member.mention for member in discord_members if member]
     if not discord_members:
         to_send = f'Cannot find authors for challenge "{challenge_selected}".'
@@ -92,13 +103,16 @@ def display_problem(db: Database, context: commands.context.Context, challenge_s
     return to_send
 
 
-def display_last_days(db: Database, days_num: int, username: Optional[str]) -> List[Dict[str, str]]:
-    if username is not None and not database_data.user_exists(db.session, db.tables, username, user_type=CATCH_MODE):
-        to_send = f'User {username} does not exists.'
-        to_send_list = [{'user': username, 'msg': to_send}]
-        return to_send_list
+async def display_last_days(db: Database, days_num: int, username: Optional[str]) -> List[Dict[str, str]]:
+    if username is not None:
+        user_name = db.names['users'].resolve(username)
+        if user_name is None:
+            return [{'user': username, 'msg': unknown_name(db.names['users'], 'User', username)}]
+        username = user_name
 
-    challenges_data = database_data.get_challenges_solved_during(db.session, db.tables, days_num, user_type=CATCH_MODE)
+    # not cached, the time window moves even when nothing is solved
+    challenges_data = await db.query(database_data.get_challenges_solved_during, days_num, user_type=CATCH_MODE,
+                                     users=db.scoreboard.get_users())
 
     to_send_list = []
     for challenge_data in challenges_data:
@@ -106,9 +120,8 @@ def display_last_days(db: Database, days_num: int, username: Optional[str]) -> L
         if username is not None and username_challenge != username:
             continue
         challenges = challenge_data['challenges']
-        to_send = ''
-        for challenge in challenges:
-            to_send += f' • {challenge["name"]} ({challenge["value"]} points) - {challenge["date"]}\n'
+        to_send = ''.join(f' • {challenge["name"]} ({challenge["value"]} points) - {challenge["date"]}\n'
+                          for challenge in challenges)
         to_send_list.append({'user': username_challenge, 'msg': to_send})
 
     test = [item['msg'] == '' for item in to_send_list]
@@ -122,17 +135,15 @@ def display_last_days(db: Database, days_num: int, username: Optional[str]) -> L
     return to_send_list
 
 
-def display_diff(db: Database, user1: str, user2: str) -> List[Dict[str, str]]:
-    if not database_data.user_exists(db.session, db.tables, user1, user_type=CATCH_MODE):
-        to_send = f'User {user1} does not exists.'
-        to_send_list = [{'user': user1, 'msg': to_send}]
-        return to_send_list
-    if not database_data.user_exists(db.session, db.tables, user2, user_type=CATCH_MODE):
-        to_send = f'User {user2} does not exists.'
-        to_send_list = [{'user': user2, 'msg': to_send}]
-        return to_send_list
+async def display_diff(db: Database, user1: str, user2: str) -> List[Dict[str, str]]:
+    users = [db.names['users'].resolve(user) for user in (user1, user2)]
+    for user, user_name in zip((user1, user2), users):
+        if user_name is None:
+            return [{'user': user, 'msg': unknown_name(db.names['users'], 'User', user)}]
+    user1, user2 = users
 
-    user1_diff, user2_diff = database_data.diff(db.session, db.tables, user1, user2, user_type=CATCH_MODE)
+    user1_diff, user2_diff = await db.cached_query(database_data.diff, user1, user2, user_type=CATCH_MODE,
+                                                   unkeyed=lambda: dict(users=db.scoreboard.get_users()))
     to_send_list = []
 
     to_send = '\n'.join([f' • {challenge["name"]} ({challenge["value"]} points)' for challenge in user1_diff])
@@ -143,31 +154,78 @@ def display_diff(db: Database, user1: str, user2: str) -> List[Dict[str, str]]:
     return to_send_list
 
 
-async def display_flush(context: commands.context.Context) -> str:
-    result = await channel_data.flush(context.message.channel)
-    if context.message.channel is None or not result:
+async def display_flush(context: commands.context.Context,
+                        progress: Optional[Callable[[int], Awaitable[None]]] = None) -> str:
+    if context.message.channel is None:
         return 'An error occurs while trying to flush channel data.'
-    return f'Data from channel has been flushed successfully by {context.message.author}.'
+    deleted = await channel_data.flush(context.message.channel, progress=progress)
+    if deleted is None:
+        return 'An error occurs while trying to flush channel data.'
+    return f'Data from channel has been flushed successfully by {context.message.author} ({deleted} messages deleted).'
+
+
+async def update_scoreboard(db: Database) -> None:
+    db.cache.invalidate()
+    db.scoreboard_bound = db.last_id
+    db.scoreboard_state = await db.query(database_data.get_scoreboard_state, db.scoreboard_bound)
+    db.scoreboard_loaded = time.monotonic()
+    db.banned_users = await db.query(database_data.get_banned_users)
+    db.scoreboard = await db.query(database_data.load_scoreboard, user_type=CATCH_MODE)
+    db.team_members = await db.query(database_data.get_team_members)
+    db.names = await db.query(database_data.load_names, user_type=CATCH_MODE)
+    db.cache.invalidate()  # results computed during the reload may come from the former scoreboard
 
 
-async def display_cron(db: Database) -> Tuple[Optional[str], Optional[str], Optional[int]]:
-    tag, challenge = database_data.get_new_challenges(db.session, db.tables, db.tag, user_type=CATCH_MODE)
-    db.tag = tag
-    if challenge:
+async def display_changes(db: Database) -> List[Tuple[str, str, int]]:
+    """ changes missed by the solves stream: visible challenges, bans, awards and edits of the scoreboard rows """
+    reload = time.monotonic() - db.scoreboard_loaded > SCOREBOARD_RELOAD
+    reload |= await db.query(database_data.get_scoreboard_state, db.scoreboard_bound) != db.scoreboard_state
+    to_send_list = []
+    fingerprint = await db.query(database_data.get_visible_challenges_fingerprint)
+    if fingerprint != database_data.get_fingerprint(db.challenges):
+        visible = set(await db.query(database_data.get_visible_challenges))
+        new_challenges_id, hidden_challenges_id = sorted(visible - db.challenges), sorted(db.challenges - visible)
+        db.challenges = visible
+        reload = True  # hidden challenges are not part of the scoreboard
+        challenges_info = await db.query(database_data.get_challenges_info, new_challenges_id + hidden_challenges_id)
+        for title, challenges_id, embed_color in [('New challenge available', new_challenges_id, 0x16B841),
+                                                  ('Challenge no longer available', hidden_challenges_id, 0x99AAB5)]:
+            # deleted challenges have no info left
+            to_send = '\n'.join(' • {} ({} points) - {}'.format(*challenges_info[id])
+                                 for id in challenges_id if id in challenges_info)
+            if to_send:
+                to_send_list.append((title, to_send, embed_color))
+    if reload:
+        await update_scoreboard(db)
+    return to_send_list
+
+
+async def display_cron(db: Database) -> List[Tuple[str, str, int]]:
+    if db.source.is_closed():
+        db.source.period = await db.query(database_data.get_ctf_period)  # dates may be changed by the admins
+        if db.source.is_closed():
+            return []  # solves made while closed are caught up by the watermark
+    db.last_id, challenges, db.gaps = await db.query(database_data.get_new_challenges, db.last_id,
+                                                     user_type=CATCH_MODE, gaps=db.gaps)
+    # checked on every tick, even during a stream of solves: a challenge released and solved in the same tick is
+    # announced first and its solves are part of the scoreboard
+    to_send_list = await display_changes(db)
+    if challenges:
+        db.cache.invalidate()
+    for challenge in challenges:
+        value = challenge['value']
+        if challenge['challenge_id'] in db.challenges and challenge['user_id'] not in db.banned_users:
+            db.scoreboard.add_solve(challenge['user_id'], challenge['username'], challenge['challenge_id'], value,
+                                    ranked=challenge['ranked'], counted=challenge['counted'])
+            # current value of dynamic challenges
+            value = db.scoreboard.values.get(challenge['challenge_id'], value)
+        if not challenge['ranked']:
+            continue
+        db.names['users'].add(challenge['username'])  # users registered since the last reload
         name = f'New challenge solved by {challenge["username"]}'
-        to_send = f' • {challenge["challenge"]} ({challenge["value"]} points)'
+        if challenge['member'] != challenge['username']:
+            name += f' ({challenge["member"]})'  # member of the team
+        to_send = f' • {challenge["challenge"]} ({value} points)'
         to_send += f'\n • Date: {challenge["date"]}'
-        return name, to_send, 0xFFCC00
-    challenges_id = db.challenges
-    test_challenges_id = database_data.get_visible_challenges(db.session, db.tables)
-    if (test_challenges_id == challenges_id) or (len(test_challenges_id) < len(challenges_id)):
-        db.challenges = test_challenges_id
-        return None, None, None
-    else:
-        new_challenges_id = [id for id in test_challenges_id if id not in challenges_id]
-        to_send = ''
-        for id in new_challenges_id:
-            (name, value, category) = database_data.get_challenge_info(db.session, db.tables, id)
-            to_send += f' • {name} ({value} points) - {category}'
-        db.challenges = test_challenges_id
-        return "New challenge available", to_send, 0x16B841
+        to_send_list.append((name, to_send, 0xFFCC00))
+    return to_send_list
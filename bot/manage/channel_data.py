@@ -1,21 +1,70 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
 import discord
 
+from bot import log
+from bot.constants import FLUSH_BATCH, FLUSH_DELETE_PERIOD, FLUSH_PROGRESS
+
+BULK_DELETE_AGE = timedelta(days=14) - timedelta(minutes=1)  # older messages cannot be bulk deleted
+
+
+def is_kept(message: discord.Message, newest: datetime) -> bool:
+    # solves announcements and messages of the running flush command are kept
+    if not message.embeds or not message.embeds[0].fields:
+        return False
+    title = message.embeds[0].fields[0].name
+    if 'New challenge solved by' in title:
+        return True
+    return 'FLUSH' in title and (newest - message.created_at).total_seconds() < 30
+
+
+async def flush(selected_channel: discord.channel.TextChannel,
+                progress: Optional[Callable[[int], Awaitable[None]]] = None) -> Optional[int]:
+    """ deletes the whole history in a single pass, returns the number of deleted messages or None on error
+
+    recent messages are deleted by batches of FLUSH_BATCH, older ones one by one
+    progress is awaited with the number of deleted messages every FLUSH_PROGRESS messages
+    """
+    newest, deleted, batch = None, 0, []
+    bulk_limit = datetime.utcnow() - BULK_DELETE_AGE
+
+    async def deleted_messages(count: int) -> None:
+        nonlocal deleted
+        previous, deleted = deleted, deleted + count
+        if progress is not None and previous // FLUSH_PROGRESS != deleted // FLUSH_PROGRESS:
+            await progress(deleted)
+
+    async def bulk_delete(messages: List[discord.Message]) -> None:
+        if messages:
+            await selected_channel.delete_messages(messages)
+            await deleted_messages(len(messages))
 
-async def flush(selected_channel: discord.channel.TextChannel) -> bool:
-    discord_timestamp = None
-    async for m in selected_channel.history(limit=100):
-        if discord_timestamp is None:
-            discord_timestamp = m.created_at
-        if len(m.embeds) > 0 and hasattr(m.embeds[0], 'fields'):
-            embed_msg = m.embeds[0].fields[0]
-            title = embed_msg.name
-            duration = (discord_timestamp - m.created_at).seconds
-            if 'New challenge solved by' in title:
-                pass
-            elif 'FLUSH' in title and duration < 30:
-                pass
-            else:
+    try:
+        # newest messages first
+        async for m in selected_channel.history(limit=None):
+            if newest is None:
+                newest = m.created_at
+            if is_kept(m, newest):
+                continue
+            if m.created_at > bulk_limit:
+                batch.append(m)
+                if len(batch) == FLUSH_BATCH:
+                    await bulk_delete(batch)
+                    batch = []
+                continue
+            await bulk_delete(batch)
+            batch = []
+            try:
                 await m.delete()
-        else:
-            await m.delete()
-    return True
+            except discord.NotFound:
+                continue
+            await deleted_messages(1)
+            await asyncio.sleep(FLUSH_DELETE_PERIOD)
+        await bulk_delete(batch)
+    except discord.HTTPException as error:
+        log.warn('Cannot flush channel', channel=str(selected_channel), deleted=deleted, error=str(error))
+        return None
+    log.info('Channel flushed', channel=str(selected_channel), deleted=deleted)
+    return deleted
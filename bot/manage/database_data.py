@@ -1,25 +1,38 @@
-import hashlib
 import ipaddress
 import re
 import socket
 import struct
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from sqlalchemy import desc, func
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, desc, func, or_
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.sql import ColumnElement
 
+from bot.constants import CACHE_SIZE, FINGERPRINT_HASHES, FINGERPRINT_PRIME, SUBMISSIONS_WINDOW
 from bot.database.tables import CTFdTables
+from bot.manage.names import NameIndex
+from bot.manage.scoreboard import Scoreboard
 
 
 def get_ctf_name(s: Session, tables: CTFdTables) -> str:
     return s.query(tables.config).filter_by(key='ctf_name').first().value
 
 
+def get_ctf_period(s: Session, tables: CTFdTables) -> Tuple[Optional[int], Optional[int]]:
+    """ start and end timestamps of the CTF, None when not set in CTFd """
+    config = s.query(tables.config.key, tables.config.value). \
+        filter(tables.config.key.in_(['start', 'end'])). \
+        all()
+    config = dict(config)
+    return tuple(int(config[key]) if config.get(key) else None for key in ('start', 'end'))
+
+
 def get_false_submissions(s: Session, tables: CTFdTables) -> List[Dict]:
     return s.query(tables.users.name, tables.challenges.name, tables.submissions.provided). \
         join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
-        join(tables.users, tables.users.id == tables.submissions.user_id). \
+        join(tables.users, tables.users.id == tables.account_id(tables.submissions)). \
         filter(tables.submissions.type == 'incorrect'). \
         group_by(tables.challenges.id). \
         all()
@@ -35,16 +48,158 @@ def get_challenge_info(s: Session, tables: CTFdTables, id: int) -> Optional[Tupl
         filter(tables.challenges.id == id).first()
 
 
-def get_scoreboard(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Dict]:
-    scoreboard = s.query(tables.users.name, func.sum(tables.challenges.value).label('score')). \
-        join(tables.solves, tables.users.id == tables.solves.user_id). \
-        join(tables.challenges, tables.challenges.id == tables.solves.challenge_id)
+def _xor(a: ColumnElement, b: ColumnElement) -> ColumnElement:
+    # SQLite has no xor operator
+    return a.op('|')(b) - a.op('&')(b)
+
+
+def hash_challenge_id(id: int, first: int, second: int) -> int:
+    # same operations as the sql of get_visible_challenges_fingerprint, bit for bit
+    value = id * first % FINGERPRINT_PRIME
+    value = (value ^ (value >> 15)) * second % FINGERPRINT_PRIME
+    return value ^ (value >> 13)
+
+
+def get_fingerprint(challenges_id: Iterable[int]) -> Tuple[int, int, int]:
+    """ same as get_visible_challenges_fingerprint, computed from known ids """
+    challenges_id = list(challenges_id)
+    first, second = (sum(hash_challenge_id(id, *multipliers) for id in challenges_id)
+                     for multipliers in FINGERPRINT_HASHES)
+    return len(challenges_id), first, second
+
+
+def get_visible_challenges_fingerprint(s: Session, tables: CTFdTables) -> Tuple[int, int, int]:
+    """ count of the visible challenges and two sums of hashes of their ids, one aggregate row
+
+    the ids are mixed like hash_challenge_id does, sums of the raw ids are equal for different sets of challenges
+    """
+    sums = []
+    for first, second in FINGERPRINT_HASHES:
+        value = tables.challenges.id * first % FINGERPRINT_PRIME
+        value = _xor(value, value.op('>>')(15)) * second % FINGERPRINT_PRIME
+        sums.append(func.sum(_xor(value, value.op('>>')(13))))
+    fingerprint = s.query(func.count(tables.challenges.id), *sums). \
+        filter(tables.challenges.state == 'visible'). \
+        first()
+    return tuple(int(value or 0) for value in fingerprint)
+
+
+def get_challenges_info(s: Session, tables: CTFdTables, ids: List[int]) -> Dict[int, Tuple[str, str, str]]:
+    if not ids:
+        return dict()
+    challenges = s.query(tables.challenges.id, tables.challenges.name, tables.challenges.value,
+                         tables.challenges.category). \
+        filter(tables.challenges.id.in_(ids)). \
+        all()
+    return {id: (name, value, category) for (id, name, value, category) in challenges}
+
+
+def get_scoreboard_solves(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Tuple[int, str, int, int]]:
+    # banned users and hidden challenges are not part of the scoreboard
+    solves = s.query(tables.users.id, tables.users.name, tables.challenges.id, tables.challenges.value). \
+        join(tables.solves, tables.users.id == tables.account_id(tables.solves)). \
+        join(tables.challenges, tables.challenges.id == tables.solves.challenge_id). \
+        filter(tables.users.banned.isnot(True)). \
+        filter(tables.challenges.state != 'hidden')
     if user_type != 'all':
-        scoreboard = scoreboard.filter(tables.users.type == user_type)
-    scoreboard = scoreboard.group_by(tables.users.id).all()
+        solves = solves.filter(tables.type_filter(user_type))
+    return solves.order_by(tables.users.id).all()
 
-    score_list = [dict(username=username, score=score_user) for (username, score_user) in scoreboard]
-    return sorted(score_list, key=lambda item: item['score'], reverse=True)
+
+def get_dynamic_challenges(s: Session, tables: CTFdTables) -> Dict[int, Tuple[int, int, int]]:
+    dynamic_challenges = s.query(tables.dynamic_challenge.id, tables.dynamic_challenge.initial,
+                                 tables.dynamic_challenge.minimum, tables.dynamic_challenge.decay).all()
+    return {int(id): (initial, minimum, decay) for (id, initial, minimum, decay) in dynamic_challenges}
+
+
+def get_awards(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Tuple[int, str, int]]:
+    awards = s.query(tables.users.id, tables.users.name, func.sum(tables.awards.value)). \
+        join(tables.awards, tables.users.id == tables.account_id(tables.awards)). \
+        filter(tables.users.banned.isnot(True))
+    if user_type != 'all':
+        awards = awards.filter(tables.type_filter(user_type))
+    return [(user_id, username, int(value or 0)) for (user_id, username, value) in
+            awards.group_by(tables.users.id).all()]
+
+
+def get_dynamic_solves(s: Session, tables: CTFdTables) -> List[Tuple[int, int]]:
+    """ (challenge id, account id) of the solves counted by CTFd in the values of dynamic challenges
+
+    accounts of every type are counted, unless they are hidden or banned
+    """
+    return s.query(tables.solves.challenge_id, tables.users.id). \
+        join(tables.users, tables.users.id == tables.account_id(tables.solves)). \
+        join(tables.dynamic_challenge, tables.dynamic_challenge.id == tables.solves.challenge_id). \
+        filter(tables.users.hidden.isnot(True)). \
+        filter(tables.users.banned.isnot(True)). \
+        all()
+
+
+def load_scoreboard(s: Session, tables: CTFdTables, user_type: str = 'all') -> Scoreboard:
+    # <user_type> selects the ranked users, not the solves counted in dynamic values
+    scoreboard = Scoreboard()
+    scoreboard.load(get_scoreboard_solves(s, tables, user_type=user_type), dynamic=get_dynamic_challenges(s, tables),
+                    awards=get_awards(s, tables, user_type=user_type), dynamic_solves=get_dynamic_solves(s, tables))
+    return scoreboard
+
+
+def get_scoreboard(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Dict]:
+    return load_scoreboard(s, tables, user_type=user_type).get_scoreboard()
+
+
+def get_banned_users(s: Session, tables: CTFdTables) -> List[int]:
+    banned_users = s.query(tables.users.id).filter(tables.users.banned.is_(True)).order_by(tables.users.id).all()
+    return [int(item[0]) for item in banned_users]
+
+
+def get_scoreboard_state(s: Session, tables: CTFdTables, last_id: Optional[int] = None) -> Tuple:
+    """ aggregates of the changes that are not part of the solves stream, one row
+
+    banned and hidden users, awards, renamed users, challenges values and names, solves up to <last_id>: solves after
+    it are added by the cron task, a deleted one lowers the count
+    """
+    banned_users = s.query(func.count(tables.users.id), func.sum(tables.users.id)). \
+        filter(tables.users.banned.is_(True)).subquery()
+    hidden_users = s.query(func.count(tables.users.id), func.sum(tables.users.id)). \
+        filter(tables.users.hidden.is_(True)).subquery()
+    awards = s.query(func.count(tables.awards.id), func.sum(tables.awards.value)).subquery()
+    users = s.query(func.count(tables.users.id), func.sum(func.length(tables.users.name))).subquery()
+    # names lengths: a renamed challenge or category reloads the names index with the scoreboard
+    challenges = s.query(func.count(tables.challenges.id), func.sum(tables.challenges.value),
+                         func.sum(func.length(tables.challenges.name)),
+                         func.sum(func.length(tables.challenges.category))). \
+        filter(tables.challenges.state != 'hidden').subquery()
+    solves = s.query(func.count(tables.solves.id))
+    if last_id is not None:
+        solves = solves.filter(tables.solves.id <= last_id)
+    return tuple(s.query(banned_users, hidden_users, awards, users, challenges, solves.subquery()).one())
+
+
+def get_team_members(s: Session, tables: CTFdTables) -> Dict[str, List[str]]:
+    """ team name -> names of its members, empty in users mode """
+    if tables.mode != 'teams':
+        return dict()
+    members = s.query(tables.users.name, tables.members.name). \
+        join(tables.members, tables.members.team_id == tables.users.id). \
+        order_by(tables.members.id). \
+        all()
+    team_members = dict()
+    for (team, member) in members:
+        team_members.setdefault(team, []).append(member)
+    return team_members
+
+
+def load_names(s: Session, tables: CTFdTables, user_type: str = 'all') -> Dict[str, NameIndex]:
+    """ names of challenges, categories and users, hidden challenges are left out until they are shown again """
+    challenges = s.query(tables.challenges.name, tables.challenges.category). \
+        filter(tables.challenges.state != 'hidden'). \
+        all()
+    users = s.query(tables.users.name)
+    if user_type != 'all':
+        users = users.filter(tables.type_filter(user_type))
+    return dict(challenges=NameIndex(name for (name, _) in challenges),
+                categories=NameIndex({category for (_, category) in challenges}),
+                users=NameIndex(name for (name,) in users.all()))
 
 
 def get_users(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[str]:
@@ -65,20 +220,17 @@ def category_exists(s: Session, tables: CTFdTables, category: str) -> bool:
 
 
 def get_category_info(s: Session, tables: CTFdTables, category_name: str) -> List[Dict]:
-    if not category_exists(s, tables, category_name):
-        return []
-    challenges = s.query(tables.challenges).filter_by(category=category_name). \
+    # empty when the category does not exist
+    challenges = s.query(tables.challenges.name, tables.challenges.value). \
+        filter(tables.challenges.category == category_name). \
         order_by(desc(tables.challenges.value)).all()
-    category_info = []
-    for challenge in challenges:
-        category_info.append(dict(name=challenge.name, value=challenge.value))
-    return category_info
+    return [dict(name=name, value=value) for (name, value) in challenges]
 
 
 def user_exists(s: Session, tables: CTFdTables, user: str, user_type: str = 'all') -> bool:
     query = s.query(tables.users)
     if user_type != 'all':
-        query = query.filter(tables.users.type == user_type)
+        query = query.filter(tables.type_filter(user_type))
     query = query.filter(tables.users.name == user).first()
     return query is not None
 
@@ -90,143 +242,195 @@ def challenge_exists(s: Session, tables: CTFdTables, challenge: str) -> bool:
     return query is not None
 
 
-def get_authors_challenge(s: Session, tables: CTFdTables, challenge: str) -> List[Tuple[Any, Any]]:
-    if not challenge_exists(s, tables, challenge):
-        return []
-    description = s.query(tables.challenges.description). \
-        filter(tables.challenges.name == challenge). \
-        first()
-    if description is not None:
-        description = description[0]
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_authors(description: str) -> Tuple[Tuple[str, str], ...]:
+    """ discord users "name#discriminator" mentioned in a challenge description """
     result = re.findall(r'@(\w+)#(\d+)', description)
     if result:
-        return result
+        return tuple(result)
     result = re.findall(r'(.*?)#(\d+)', description)
-    if not result:
-        return result
-    return [(name.split(' ')[-1].replace('@', ''), user_id) for (name, user_id) in result]
+    return tuple((name.split(' ')[-1].replace('@', ''), user_id) for (name, user_id) in result)
 
 
-def get_users_solved_challenge(s: Session, tables: CTFdTables, challenge: str, user_type: str = 'all'):
-    if not challenge_exists(s, tables, challenge):
-        return None
-    users = get_users(s, tables, user_type=user_type)
-    users_solves = s.query(tables.users.name). \
-        join(tables.solves, tables.users.id == tables.solves.user_id). \
-        join(tables.challenges, tables.challenges.id == tables.solves.challenge_id). \
-        filter(tables.challenges.name == challenge)
+def get_authors_challenge(s: Session, tables: CTFdTables, challenge: str) -> List[Tuple[str, str]]:
+    description = s.query(tables.challenges.description). \
+        filter(tables.challenges.name == challenge). \
+        first()
+    if description is None or description[0] is None:
+        return []
+    return list(parse_authors(description[0]))
+
+
+def get_users_solved_challenge(s: Session, tables: CTFdTables, challenge: str, user_type: str = 'all',
+                               users: Optional[List[str]] = None):
+    """ None when the challenge does not exist """
+    if users is None:
+        users = get_users(s, tables, user_type=user_type)
+    # outer joins: a challenge without solves still gives a row, its existence is known from the same query
+    solver = tables.users.id == tables.account_id(tables.solves)
     if user_type != 'all':
-        users_solves.filter(tables.users.type == user_type)
-    users_solves = users_solves.all()
+        solver = and_(solver, tables.type_filter(user_type))
+    users_solves = s.query(tables.users.name). \
+        select_from(tables.challenges). \
+        outerjoin(tables.solves, tables.solves.challenge_id == tables.challenges.id). \
+        outerjoin(tables.users, solver). \
+        filter(tables.challenges.name == challenge). \
+        all()
+    if not users_solves:
+        return None
 
-    users_solves = [item[0] for item in users_solves]
     # sort users by their rank in the scoreboard
-    return [user for user in users if user in users_solves]
+    ranks = {user: rank for rank, user in enumerate(users)}
+    users_solves = {item[0] for item in users_solves if item[0] in ranks}
+    return sorted(users_solves, key=ranks.__getitem__)
 
 
-def get_challenges_solved_during(s: Session, tables: CTFdTables, days: int = 1, user_type: str = 'all') -> List[Dict]:
+def get_challenges_solved_during(s: Session, tables: CTFdTables, days: int = 1, user_type: str = 'all',
+                                 users: Optional[List[str]] = None) -> List[Dict]:
     date_reference = (datetime.now() - timedelta(days=days))  # %y-%m-%d %H:%M:%S
-    solved_challenges = s.query(tables.submissions). \
-        join(tables.users, tables.users.id == tables.submissions.user_id). \
+    solved_challenges = s.query(tables.users.name, tables.challenges.name, tables.challenges.value,
+                                tables.submissions.date). \
+        join(tables.users, tables.users.id == tables.account_id(tables.submissions)). \
         join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
         filter(tables.submissions.type == 'correct'). \
         filter(tables.submissions.date > date_reference)
     if user_type != 'all':
-        solved_challenges = solved_challenges.filter(tables.users.type == user_type)
+        solved_challenges = solved_challenges.filter(tables.type_filter(user_type))
     solved_challenges = solved_challenges. \
         order_by(desc(tables.submissions.date)).all()
 
-    users = get_users(s, tables, user_type=user_type)
-    result_challenges_solved = []
-    for user in users:
-        solved_during_days = [dict(name=solve.challenges.name, value=solve.challenges.value, date=solve.date)
-                              for solve in solved_challenges if solve.users.name == user]
-        result_challenges_solved.append(dict(username=user, challenges=solved_during_days))
-    return result_challenges_solved
+    if users is None:
+        users = get_users(s, tables, user_type=user_type)
+    # group solves by user in a single pass, users are kept in scoreboard order
+    solved_by_user = {user: [] for user in users}
+    for (username, name, value, date) in solved_challenges:
+        if username in solved_by_user:
+            solved_by_user[username].append(dict(name=name, value=value, date=date))
+    return [dict(username=user, challenges=challenges) for user, challenges in solved_by_user.items()]
+
+
+def get_solved_challenges(s: Session, tables: CTFdTables, users: List[str], user_type: str = 'all') \
+        -> Dict[str, List[Dict]]:
+    """ username -> challenges solved, for every user of <users> matching <user_type> """
+    solved_challenges = s.query(tables.users.name, tables.challenges.name, tables.challenges.value). \
+        join(tables.submissions, tables.challenges.id == tables.submissions.challenge_id). \
+        join(tables.users, tables.users.id == tables.account_id(tables.submissions)). \
+        filter(tables.users.name.in_(users)). \
+        filter(tables.submissions.type == 'correct')
+    if user_type != 'all':
+        solved_challenges = solved_challenges.filter(tables.type_filter(user_type))
+    solved_challenges = solved_challenges.order_by(desc(tables.challenges.value)).all()
+    solved_by_user = {user: [] for user in users}
+    for (username, name, value) in solved_challenges:
+        solved_by_user[username].append(dict(name=name, value=value))
+    return solved_by_user
 
 
 def challenges_solved_by_user(s: Session, tables: CTFdTables, user: str, user_type: str = 'all') -> List[Dict]:
-    if not user_exists(s, tables, user, user_type=user_type):
-        return []
-    solved_challenges = s.query(tables.submissions). \
-        join(tables.users, tables.users.id == tables.submissions.user_id). \
-        join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
-        filter(tables.users.name == user). \
-        filter(tables.submissions.type == 'correct'). \
-        order_by(desc(tables.challenges.value)). \
-        all()
-    return [dict(name=item.challenges.name, value=item.challenges.value) for item in solved_challenges]
+    # empty when the user does not exist
+    return get_solved_challenges(s, tables, [user], user_type=user_type)[user]
 
 
-def diff(s: Session, tables: CTFdTables, user1: str, user2: str, user_type: str = 'all') -> Tuple[
-    List[Dict], List[Dict]]:
-    users = get_users(s, tables, user_type=user_type)
+def diff(s: Session, tables: CTFdTables, user1: str, user2: str, user_type: str = 'all',
+         users: Optional[List[str]] = None) -> Tuple[List[Dict], List[Dict]]:
+    if users is None:
+        users = get_users(s, tables, user_type=user_type)
+    users = set(users)
+    user1, user2 = user1.strip(), user2.strip()
     if user1 not in users or user2 not in users:
         return [], []
-    user1, user2 = user1.strip(), user2.strip()
-    solved_challenges_1 = challenges_solved_by_user(s, tables, user1, user_type=user_type)
-    solved_challenges_2 = challenges_solved_by_user(s, tables, user2, user_type=user_type)
-    all_challs = solved_challenges_1 + solved_challenges_2
-    diff1 = [item for item in all_challs if item in solved_challenges_1 and item not in solved_challenges_2]
-    diff2 = [item for item in all_challs if item in solved_challenges_2 and item not in solved_challenges_1]
+    # solves of both users in a single query
+    solved = get_solved_challenges(s, tables, [user1, user2], user_type=user_type)
+    solved_challenges_1, solved_challenges_2 = solved[user1], solved[user2]
+    solved_1 = {(item['name'], item['value']) for item in solved_challenges_1}
+    solved_2 = {(item['name'], item['value']) for item in solved_challenges_2}
+    diff1 = [item for item in solved_challenges_1 if (item['name'], item['value']) not in solved_2]
+    diff2 = [item for item in solved_challenges_2 if (item['name'], item['value']) not in solved_1]
     return diff1, diff2
 
 
 def track_user(s: Session, tables: CTFdTables, user: str, user_type: str = 'all') -> List[str]:
     user = user.strip()
-    if not user_exists(s, tables, user, user_type=user_type):
-        return []
+    # ips of the members in teams mode, empty when the user does not exist
     ips = s.query(tables.tracking.ip). \
-        join(tables.users, tables.users.id == tables.tracking.user_id). \
-        filter(tables.users.name == user). \
-        distinct().all()
+        join(tables.members, tables.members.id == tables.tracking.user_id)
+    if tables.mode == 'teams':
+        ips = ips.join(tables.users, tables.users.id == tables.members.team_id)
+    ips = ips.filter(tables.users.name == user)
+    if user_type != 'all':
+        ips = ips.filter(tables.type_filter(user_type))
+    ips = ips.distinct().all()
     ips = [item[0] for item in ips]
     ips = [ip for ip in ips if ipaddress.ip_address(ip).__class__.__name__ == 'IPv4Address']
     return sorted(ips, key=lambda ip: struct.unpack("!L", socket.inet_aton(ip))[0])
 
 
-def get_challenges_solved(s: Session, tables: CTFdTables, user_type: str = 'all') -> List:
-    challenges = s.query(tables.submissions). \
+def get_challenges_solved(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Tuple]:
+    """ rows of (id, date, username, challenge, value) from the newest solve to the oldest """
+    challenges = s.query(tables.submissions.id, tables.submissions.date, tables.users.name.label('username'),
+                         tables.challenges.name.label('challenge'), tables.challenges.value). \
         join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
-        join(tables.users, tables.users.id == tables.submissions.user_id). \
+        join(tables.users, tables.users.id == tables.account_id(tables.submissions)). \
         filter(tables.submissions.type == 'correct')
     if user_type != 'all':
-        challenges = challenges.filter(tables.users.type == user_type)
+        challenges = challenges.filter(tables.type_filter(user_type))
     return challenges.order_by(desc(tables.submissions.date)).all()
 
 
-def get_tag(challenge: Any) -> str:
-    tag_value = f'{challenge.users.id} | {challenge.challenges.id}'
-    return hashlib.sha224(tag_value.encode()).hexdigest()
-
-
-def select_challenges_by_tags(challenges: List, tag: str) -> List[Any]:
-    selected_challenges = []
-    for key, challenge in enumerate(challenges):
-        if get_tag(challenge) != tag:
-            selected_challenges.append(challenge)
-        else:
-            return selected_challenges[::-1]  # sort from oldest to newest
-    return selected_challenges[::-1]  # sort from oldest to newest
-
-
-def get_new_challenges(s: Session, tables: CTFdTables, tag: str, user_type: str = 'all') -> Tuple[str, Dict]:
-    new_challenge = dict()
-    new_tag = None
-    challenges = get_challenges_solved(s, tables, user_type=user_type)
-
-    if tag is None:
-        if len(challenges) > 0:
-            new_tag = get_tag(challenges[0])
-        return new_tag, new_challenge
-
-    selected_challenges = select_challenges_by_tags(challenges, tag)
-    if len(selected_challenges) > 0:
-        item = selected_challenges[0]
-        new_tag = get_tag(item)
-        new_challenge = dict(username=item.users.name, challenge=item.challenges.name, value=item.challenges.value,
-                             date=item.date)
-        #  log.debug(f'New solve', username=item.users.name, challenge=item.challenges.name, date=item.date)
-        return new_tag, new_challenge
-    else:
-        return tag, new_challenge
+def get_last_submission_id(s: Session, tables: CTFdTables) -> int:
+    last_id = s.query(func.max(tables.submissions.id)).scalar()
+    return 0 if last_id is None else int(last_id)
+
+
+def get_submissions_since(s: Session, tables: CTFdTables, last_id: int, user_type: str = 'all',
+                          gaps: Iterable[int] = ()) -> List[Tuple]:
+    """ rows of (id, type, date, user id, username, member name, ranked, counted, challenge id, challenge, value)
+
+    member name: player who submitted the flag, the same as username in users mode
+    ranked: the user matches <user_type>
+    counted: the account is counted in the values of dynamic challenges, neither hidden nor banned
+    gaps: ids below <last_id> missing when they were read, read again
+    """
+    # range scan on the primary key, incorrect submissions are kept to move the watermark forward
+    member = aliased(tables.members)
+    return s.query(tables.submissions.id, tables.submissions.type, tables.submissions.date, tables.users.id,
+                   tables.users.name, member.name, tables.type_filter(user_type),
+                   and_(tables.users.hidden.isnot(True), tables.users.banned.isnot(True)), tables.challenges.id,
+                   tables.challenges.name, tables.challenges.value). \
+        join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
+        join(tables.users, tables.users.id == tables.account_id(tables.submissions)). \
+        join(member, member.id == tables.submissions.user_id). \
+        filter(or_(tables.submissions.id > last_id, tables.submissions.id.in_(gaps)) if gaps else
+               tables.submissions.id > last_id). \
+        order_by(tables.submissions.id). \
+        all()
+
+
+def get_new_challenges(s: Session, tables: CTFdTables, last_id: Optional[int], user_type: str = 'all',
+                       gaps: Iterable[int] = ()) -> Tuple[int, List[Dict], List[int]]:
+    """ new watermark, solves made after <last_id> or in <gaps>, and ids still missing below the new watermark
+
+    only the ranked solves are announced, see get_submissions_since
+
+    with several CTFd workers, a submission can be committed after a submission with a greater id was read
+    its id is kept as a gap and read again until it is found or SUBMISSIONS_WINDOW ids behind the watermark
+    """
+    if last_id is None:
+        return get_last_submission_id(s, tables), [], []
+
+    new_challenges, read = [], set()
+    submissions = get_submissions_since(s, tables, last_id, user_type=user_type, gaps=gaps)
+    previous_id = last_id
+    for (submission_id, submission_type, date, user_id, username, member, ranked, counted, challenge_id,
+         challenge_name, value) in submissions:
+        last_id = max(last_id, submission_id)
+        read.add(submission_id)
+        if submission_type != 'correct' or not (ranked or counted):
+            continue
+        # solves that are not ranked are still counted in the values of dynamic challenges
+        new_challenges.append(dict(user_id=user_id, username=username, member=member, challenge_id=challenge_id,
+                                   challenge=challenge_name, value=value, date=date, ranked=bool(ranked),
+                                   counted=bool(counted)))
+    oldest = last_id - SUBMISSIONS_WINDOW
+    gaps = set(gaps) | set(range(max(previous_id, oldest) + 1, last_id))
+    return last_id, new_challenges, sorted(id for id in gaps - read if id > oldest)  # solves from oldest to newest
@@ -1,18 +1,29 @@
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import discord
 from discord.ext import commands
 from discord.utils import get
 
-from bot.constants import BOT_CHANNEL
+from bot.constants import BOT_CHANNELS, CTFD_INSTANCES
 
 
-def get_channel(bot: commands.bot.Bot) -> Optional[discord.channel.TextChannel]:
-    for server in bot.guilds:
-        for channel in server.channels:
-            if str(channel) == BOT_CHANNEL:
-                return channel
-    return None
+def get_bot_channels() -> List[str]:
+    # channels of every CTFd instance
+    return [channel for instance in CTFD_INSTANCES.values() for channel in instance.get('channels') or BOT_CHANNELS]
+
+
+def is_bot_channel(channel: discord.abc.GuildChannel, bot_channels: Optional[List[str]] = None) -> bool:
+    # items are "<channel>" for every guild or "<guild>/<channel>"
+    for bot_channel in get_bot_channels() if bot_channels is None else bot_channels:
+        guild_name, _, channel_name = bot_channel.rpartition('/')
+        if str(channel) == channel_name and (not guild_name or str(getattr(channel, 'guild', '')) == guild_name):
+            return True
+    return False
+
+
+def get_channels(bot: commands.bot.Bot, bot_channels: Optional[List[str]] = None) -> List[discord.channel.TextChannel]:
+    return [channel for server in bot.guilds for channel in server.text_channels
+            if is_bot_channel(channel, bot_channels)]
 
 
 def get_emoji(bot: commands.bot.Bot, emoji: str):
@@ -21,3 +32,44 @@ def get_emoji(bot: commands.bot.Bot, emoji: str):
 
 def get_command_args(context: commands.context.Context) -> List[str]:
     return context.message.content.strip().split()[1:]
+
+
+class MemberIndex:
+
+    def __init__(self) -> None:
+        """ members of each guild by "name#discriminator" and by id, kept up to date from discord events """
+        self.names: Dict[int, Dict[str, discord.Member]] = dict()  # guild id -> name#discriminator -> member
+        # guild id -> member id -> (key in self.names, member), the name of a member changes in place
+        self.ids: Dict[int, Dict[int, Tuple[str, discord.Member]]] = dict()
+
+    def build(self, guilds: Iterable[discord.Guild]) -> None:
+        for guild in guilds:
+            self.names[guild.id], self.ids[guild.id] = dict(), dict()
+            for member in guild.members:
+                self.add(member)
+
+    def remove_guild(self, guild: discord.Guild) -> None:
+        self.names.pop(guild.id, None)
+        self.ids.pop(guild.id, None)
+
+    def add(self, member: discord.Member) -> None:
+        self.remove(member)
+        self.names.setdefault(member.guild.id, dict())[str(member)] = member
+        self.ids.setdefault(member.guild.id, dict())[member.id] = (str(member), member)
+
+    def remove(self, member: discord.Member) -> None:
+        key, _ = self.ids.get(member.guild.id, dict()).pop(member.id, (None, None))
+        if key is not None:
+            self.names[member.guild.id].pop(key, None)
+
+    def update_user(self, user: discord.User) -> None:
+        """ username changes are not sent per guild """
+        for members in self.ids.values():
+            if user.id in members:
+                self.add(members[user.id][1])
+
+    def get(self, guild: discord.Guild, key: Union[str, int]) -> Optional[discord.Member]:
+        """ key: "name#discriminator" or member id """
+        if isinstance(key, int):
+            return self.ids.get(guild.id, dict()).get(key, (None, None))[1]
+        return self.names.get(guild.id, dict()).get(key)
@@ -0,0 +1,78 @@
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set
+
+from bot.constants import NAME_SIMILARITY, NAME_SUGGESTIONS
+
+
+def get_trigrams(name: str) -> Set[str]:
+    # padded so that short names and first letters weigh in the similarity
+    name = f'  {name.lower()} '
+    return {name[i:i + 3] for i in range(len(name) - 2)}
+
+
+class NameIndex:
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        """ names of challenges, categories or users, resolved and suggested without database queries """
+        self.names: Dict[str, List[str]] = dict()  # lower case name -> names
+        self.sorted: List[str] = []  # lower case names, for prefix lookups
+        self.trigrams: Dict[str, Set[str]] = dict()  # trigram -> lower case names
+        self.build(names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names.get(name.lower(), ())
+
+    def __len__(self) -> int:
+        return sum(len(names) for names in self.names.values())
+
+    def build(self, names: Iterable[str]) -> None:
+        self.names, self.trigrams = dict(), dict()
+        for name in names:
+            self.index(name)
+        self.sorted = sorted(self.names)
+
+    def add(self, name: str) -> None:
+        if name.lower() not in self.names:
+            insort(self.sorted, name.lower())
+        self.index(name)
+
+    def index(self, name: str) -> None:
+        key = name.lower()
+        names = self.names.setdefault(key, [])
+        if name not in names:
+            names.append(name)
+        for trigram in get_trigrams(key):
+            self.trigrams.setdefault(trigram, set()).add(key)
+
+    def prefixed(self, key: str, limit: int) -> List[str]:
+        """ first <limit> lower case names starting with <key> """
+        start = bisect_left(self.sorted, key)
+        return [item for item in self.sorted[start:start + limit] if item.startswith(key)]
+
+    def resolve(self, name: str) -> Optional[str]:
+        """ name itself, else the only name equal to it ignoring case or starting with it """
+        if name in self:
+            return name
+        key = name.lower()
+        if key not in self.names:
+            matches = self.prefixed(key, 2)
+            if len(matches) != 1:
+                return None
+            key = matches[0]
+        names = self.names[key]
+        return names[0] if len(names) == 1 else None
+
+    def suggest(self, name: str, limit: int = NAME_SUGGESTIONS, similarity: float = NAME_SIMILARITY) -> List[str]:
+        """ names starting with <name>, then the names sharing the most trigrams with it """
+        key = name.lower()
+        trigrams = get_trigrams(key)
+        common = dict()  # lower case name -> trigrams in common
+        for trigram in trigrams:
+            for item in self.trigrams.get(trigram, ()):
+                common[item] = common.get(item, 0) + 1
+        # dice coefficient of the trigrams sets
+        scores = sorted((-2 * count / (len(trigrams) + len(get_trigrams(item))), item)
+                        for item, count in common.items())
+        found = self.prefixed(key, limit)
+        found += [item for (score, item) in scores if -score >= similarity and item not in found]
+        return [name for item in found for name in self.names[item]][:limit]
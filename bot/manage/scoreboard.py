@@ -0,0 +1,121 @@
+import math
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def get_dynamic_value(initial: int, minimum: int, decay: int, solve_count: int) -> int:
+    # same formula as CTFd dynamic challenges, the first solve does not decrease the value
+    if solve_count != 0:
+        solve_count -= 1
+    if not decay:
+        return initial if solve_count == 0 else minimum
+    value = math.ceil(((minimum - initial) / (decay ** 2)) * (solve_count ** 2) + initial)
+    return max(value, minimum)
+
+
+class Scoreboard:
+
+    def __init__(self) -> None:
+        self.users = dict()  # user id -> [username, score]
+        self.names = dict()  # username -> user id
+        self.solves: Dict[int, Set[int]] = dict()  # challenge id -> ids of users who solved it
+        self.challenges: Dict[int, int] = dict()  # challenge id -> value stored in CTFd
+        self.dynamic: Dict[int, Tuple[int, int, int]] = dict()  # challenge id -> (initial, minimum, decay)
+        # dynamic challenge id -> ids of the accounts counted by CTFd in its value: any type, neither hidden nor banned
+        self.counted: Dict[int, Set[int]] = dict()
+        self.values: Dict[int, int] = dict()  # challenge id -> current value, kept until its solve count changes
+        self.awards: Dict[int, int] = dict()  # user id -> sum of awards
+        self.ranking: List[Tuple[int, int]] = []  # (-score, user id) sorted from first to last rank
+
+    def load(self, solves: Iterable[Tuple[int, str, int, int]],
+             dynamic: Optional[Dict[int, Tuple[int, int, int]]] = None,
+             awards: Optional[Iterable[Tuple[int, str, int]]] = None,
+             dynamic_solves: Optional[Iterable[Tuple[int, int]]] = None) -> None:
+        """ solves: (user id, username, challenge id, value), awards: (user id, username, value)
+
+        dynamic_solves: (challenge id, account id) counted in the values of dynamic challenges, the ranked solves by
+        default
+        """
+        self.__init__()
+        self.dynamic = dict(dynamic or {})
+        for (user_id, username, challenge_id, value) in solves:
+            self.users.setdefault(user_id, [username, 0])
+            self.challenges[challenge_id] = value
+            self.solves.setdefault(challenge_id, set()).add(user_id)
+        if dynamic_solves is None:
+            dynamic_solves = [(challenge_id, user_id) for challenge_id, solvers in self.solves.items()
+                              for user_id in solvers]
+        for (challenge_id, account_id) in dynamic_solves:
+            if challenge_id in self.dynamic:
+                self.counted.setdefault(challenge_id, set()).add(account_id)
+        for (user_id, username, value) in awards or []:
+            self.users.setdefault(user_id, [username, 0])
+            self.awards[user_id] = value
+
+        # every challenge value is computed once from its solve count, then summed per user
+        self.values = {challenge_id: self.get_value(challenge_id) for challenge_id in self.solves}
+        scores = dict(self.awards)
+        for challenge_id, solvers in self.solves.items():
+            value = self.values[challenge_id]
+            for user_id in solvers:
+                scores[user_id] = scores.get(user_id, 0) + value
+        for user_id, user in self.users.items():
+            user[1] = scores.get(user_id, 0)
+            self.names[user[0]] = user_id
+        self.ranking = sorted((-score, user_id) for user_id, (username, score) in self.users.items())
+
+    def get_value(self, challenge_id: int) -> int:
+        if challenge_id in self.dynamic:
+            initial, minimum, decay = self.dynamic[challenge_id]
+            return get_dynamic_value(initial, minimum, decay, len(self.counted.get(challenge_id, ())))
+        return self.challenges[challenge_id]
+
+    def set_score(self, user_id: int, username: str, score: int) -> None:
+        if user_id in self.users:
+            old_username, old_score = self.users[user_id]
+            self.names.pop(old_username, None)
+            del self.ranking[bisect_left(self.ranking, (-old_score, user_id))]
+        self.users[user_id] = [username, score]
+        self.names[username] = user_id
+        insort(self.ranking, (-score, user_id))
+
+    def add_solve(self, user_id: int, username: str, challenge_id: int, value: int, ranked: bool = True,
+                  counted: bool = True) -> bool:
+        """ ranked: the user is part of the scoreboard, counted: the solve is counted in dynamic values """
+        solvers = self.solves.setdefault(challenge_id, set())
+        counted = counted and challenge_id in self.dynamic and user_id not in self.counted.get(challenge_id, ())
+        ranked = ranked and user_id not in solvers
+        if not counted and not ranked:
+            return False  # solve already counted
+        if counted:
+            self.counted.setdefault(challenge_id, set()).add(user_id)
+        self.challenges.setdefault(challenge_id, value)
+        new_value = self.get_value(challenge_id)
+        old_value = self.values.get(challenge_id, new_value)
+        self.values[challenge_id] = new_value
+        if new_value != old_value:  # dynamic challenge, previous solvers lose points
+            for solver in solvers:
+                solver_name, solver_score = self.users[solver]
+                self.set_score(solver, solver_name, solver_score + new_value - old_value)
+        if ranked:
+            solvers.add(user_id)
+            score = self.users[user_id][1] if user_id in self.users else 0
+            self.set_score(user_id, username, score + new_value)
+        return True
+
+    def get_rank(self, username: str) -> Optional[int]:
+        user_id = self.names.get(username)
+        if user_id is None:
+            return None
+        return bisect_left(self.ranking, (-self.users[user_id][1], user_id))
+
+    def get_score(self, username: str) -> Optional[int]:
+        user_id = self.names.get(username)
+        return None if user_id is None else self.users[user_id][1]
+
+    def get_scoreboard(self, limit: Optional[int] = None) -> List[Dict]:
+        ranking = self.ranking if limit is None else self.ranking[:limit]
+        return [dict(username=self.users[user_id][0], score=-score) for (score, user_id) in ranking]
+
+    def get_users(self) -> List[str]:
+        return [self.users[user_id][0] for (score, user_id) in self.ranking]
@@ -0,0 +1,172 @@
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aiohttp import web  # dependency of discord.py
+
+from bot import log
+from bot.constants import METRICS_HOST, METRICS_PORT
+
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+
+
+class Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, registry: 'Registry', name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()  # queries are measured from the executor threads
+
+    def key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def format_labels(self, key: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.labels, key)) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{label}="{value}"' for (label, value) in pairs) + '}'
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """ lines of the exposition format, one per labels values """
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}'] + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Tuple[str, ...], float] = dict()
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [f'{self.name}{self.format_labels(key)} {value}' for key, value in sorted(self.values.items())]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = BUCKETS, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self.values: Dict[Tuple[str, ...], List] = dict()  # labels -> [count of each bucket, sum, count]
+
+    def observe(self, value: float, **labels: str) -> None:
+        if not self.registry.enabled:
+            return
+        key = self.key(labels)
+        with self.lock:
+            entry = self.values.setdefault(key, [[0] * len(self.buckets), 0, 0])
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        samples = []
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bucket, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    samples.append(f'{self.name}_bucket{self.format_labels(key, ("le", str(bucket)))} {cumulative}')
+                samples.append(f'{self.name}_bucket{self.format_labels(key, ("le", "+Inf"))} {count}')
+                samples.append(f'{self.name}_sum{self.format_labels(key)} {total}')
+                samples.append(f'{self.name}_count{self.format_labels(key)} {count}')
+        return samples
+
+
+class Registry:
+
+    def __init__(self, enabled: bool = True) -> None:
+        """ metrics in the prometheus text format, nothing is recorded when disabled """
+        self.enabled = enabled
+        self.metrics: List[Metric] = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.add(Counter(self, name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self.add(Gauge(self, name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = BUCKETS) \
+            -> Histogram:
+        return self.add(Histogram(self, name, help, labels, buckets=buckets))
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = Registry(enabled=METRICS_PORT is not None)
+query_duration = registry.histogram('ctfd_query_seconds', 'Duration of database_data queries.', ['query'])
+cron_duration = registry.histogram('ctfd_cron_tick_seconds', 'Duration of cron ticks.', ['instance'])
+poll_interval = registry.gauge('ctfd_poll_interval_seconds', 'Current interval of the cron task.', ['instance'])
+cache_hit_rate = registry.gauge('ctfd_cache_hit_rate', 'Hit rate of the read commands cache.', ['instance'])
+send_duration = registry.histogram('discord_send_seconds', 'Latency of discord messages.')
+queue_depth = registry.gauge('discord_queue_depth', 'Messages waiting to be sent.', ['channel'])
+loop_lag = registry.histogram('event_loop_lag_seconds', 'Delay of the event loop.')
+
+
+async def monitor_loop_lag(interval: float = 1) -> None:
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        loop_lag.observe(max(loop.time() - start - interval, 0))
+
+
+async def start_server(host: str = METRICS_HOST, port: Optional[int] = METRICS_PORT) -> None:
+    """ serves http://<host>:<port>/metrics, nothing is started in no-op mode """
+    if port is None:
+        return
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    asyncio.ensure_future(monitor_loop_lag())
+    log.info('Metrics server', url=f'http://{host}:{port}/metrics')
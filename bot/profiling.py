@@ -0,0 +1,158 @@
+import cProfile
+import heapq
+import io
+import os
+import pstats
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterator, List, Optional, Tuple
+
+import sqlalchemy
+from sqlalchemy import event
+
+from bot import log
+from bot.constants import PROFILE, PROFILE_DIR, PROFILE_SLOWEST
+
+STATEMENTS_LIMIT = 1000  # statements kept by run, others are only counted
+
+
+class Run:
+
+    def __init__(self, name: str) -> None:
+        """ one profiled command or cron tick """
+        self.name = name
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.count = 0
+        self.sql_duration = 0.0
+        self.statements: List[Tuple[float, str]] = []  # (duration, statement)
+        self.profiles: List[cProfile.Profile] = []  # event loop thread and executor threads
+        self.lock = threading.Lock()  # statements are executed from the executor threads
+
+    def add_statement(self, duration: float, statement: str) -> None:
+        with self.lock:
+            self.count += 1
+            self.sql_duration += duration
+            if len(self.statements) < STATEMENTS_LIMIT:
+                self.statements.append((duration, statement))
+
+    def add_profile(self, profile: cProfile.Profile) -> None:
+        with self.lock:
+            self.profiles.append(profile)
+
+    def report(self, statements: int = 10, functions: int = 40) -> str:
+        lines = [f'{self.name}: {self.duration * 1000:.1f} ms',
+                 f'SQL: {self.count} statements, {self.sql_duration * 1000:.1f} ms', '']
+        for duration, statement in sorted(self.statements, key=lambda item: -item[0])[:statements]:
+            lines.append(f'{duration * 1000:8.2f} ms  {" ".join(statement.split())}')
+        if self.profiles:
+            stream = io.StringIO()
+            stats = pstats.Stats(self.profiles[0], stream=stream)
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            stats.sort_stats('cumulative').print_stats(functions)
+            lines += ['', stream.getvalue()]
+        return '\n'.join(lines) + '\n'
+
+
+class Profiler:
+
+    def __init__(self, mode: Optional[str] = PROFILE, directory: str = PROFILE_DIR,
+                 slowest: int = PROFILE_SLOWEST) -> None:
+        """ mode: None, 'sql' to count and time statements, 'cprofile' to also profile python calls
+
+        reports of the <slowest> runs are kept in <directory>
+        """
+        self.mode = mode
+        self.directory = directory
+        self.slowest = slowest
+        self.current: ContextVar[Optional[Run]] = ContextVar('profiling_run', default=None)
+        self.reports: List[Tuple[float, str]] = []  # heap of (duration, path)
+        self.profiling = False  # a single profiler can be enabled in the event loop thread
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode is not None
+
+    def instrument(self, engine: sqlalchemy.engine.base.Engine) -> None:
+        if not self.enabled:
+            return
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            connection.info.setdefault('profiling_start', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+            start = connection.info['profiling_start'].pop()
+            run = self.current.get()
+            if run is not None:
+                run.add_statement(time.perf_counter() - start, statement)
+
+    def start(self, name: str) -> Optional[Tuple[Run, Token, Optional[cProfile.Profile]]]:
+        if not self.enabled:
+            return None
+        run, profile = Run(name), None
+        if self.mode == 'cprofile' and not self.profiling:
+            # concurrent commands are still timed, only the first one is profiled
+            self.profiling, profile = True, cProfile.Profile()
+            profile.enable()
+        return run, self.current.set(run), profile
+
+    def stop(self, started: Optional[Tuple[Run, Token, Optional[cProfile.Profile]]]) -> None:
+        if started is None:
+            return
+        run, token, profile = started
+        if profile is not None:
+            profile.disable()
+            self.profiling = False
+            run.add_profile(profile)
+        run.duration = time.perf_counter() - run.start
+        self.current.reset(token)
+        self.save(run)
+
+    @contextmanager
+    def profile(self, name: str) -> Iterator[Optional[Run]]:
+        started = self.start(name)
+        try:
+            yield started[0] if started else None
+        finally:
+            self.stop(started)
+
+    @contextmanager
+    def thread_profile(self) -> Iterator[None]:
+        """ profiles an executor call made for the current run """
+        run = self.current.get()
+        if run is None or self.mode != 'cprofile':
+            yield
+            return
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            run.add_profile(profile)
+
+    def save(self, run: Run) -> None:
+        if self.slowest <= 0 or (len(self.reports) >= self.slowest and run.duration <= self.reports[0][0]):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        name = re.sub(r'\W+', '_', run.name)
+        date = time.strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f'{run.duration * 1000:010.1f}ms-{name}-{date}.txt')
+        with open(path, 'w') as f:
+            f.write(run.report())
+        heapq.heappush(self.reports, (run.duration, path))
+        if len(self.reports) > self.slowest:
+            _, removed = heapq.heappop(self.reports)
+            try:
+                os.remove(removed)
+            except OSError as error:
+                log.warn('Cannot remove profiling report', path=removed, error=str(error))
+
+
+profiler = Profiler()
@@ -4,9 +4,11 @@ import sys
 from discord.ext import commands
 
 import bot.display.embed as display
-from bot import log
-from bot.constants import TOKEN, DB_URI
-from db import Database
+from bot import log, metrics
+from bot.constants import TOKEN, CTFD_INSTANCES
+from bot.manage.discord_data import MemberIndex
+from bot.profiling import profiler
+from db import Database, Databases
 
 
 class CTFdBot:
@@ -14,21 +16,90 @@ class CTFdBot:
     def __init__(self) -> None:
         """ Discord Bot to catch CTFd events made by zTeeed """
         self.bot = commands.Bot(command_prefix='>>')
-        self.bot.db = Database(DB_URI)
-        self.bot.channel = None
+        self.bot.databases = Databases(CTFD_INSTANCES)
+        self.bot.channels = []
+        self.bot.members = MemberIndex()
+
+    async def watch(self, db: Database):
+        while not self.bot.is_closed():
+            try:
+                if self.bot.channels:
+                    await display.cron(self.bot, db)
+            except Exception as error:
+                # an instance whose database is down must not stop the others, it is tried again after a backoff
+                log.error('Cron task failed', name=db.name, error=str(error))
+                db.source.update(activity=False)
+            await db.source.wait()
 
     async def cron(self):
         await self.bot.wait_until_ready()
-        while not self.bot.is_closed():
-            if self.bot.channel is not None:
-                await display.cron(self.bot)
-            await asyncio.sleep(1)
+        # every CTFd instance is watched concurrently, each one woken by its own event source
+        await asyncio.gather(*(self.watch(db) for db in self.bot.databases))
 
     def catch(self):
+        @self.bot.check
+        async def bot_channel(context: commands.context.Context) -> bool:
+            # commands are only answered in channels owned by a CTFd instance
+            return context.bot.databases.get(context.channel) is not None
+
+        @self.bot.before_invoke
+        async def start_profiling(context: commands.context.Context):
+            context.profiling = profiler.start(str(context.command))
+
+        @self.bot.after_invoke
+        async def stop_profiling(context: commands.context.Context):
+            profiler.stop(getattr(context, 'profiling', None))
+
+        @self.bot.event
+        async def on_command_error(context: commands.context.Context, error: commands.CommandError):
+            if isinstance(error, commands.CheckFailure):
+                log.warn('Unexpected channel', channel=str(context.channel), name=str(context.command))
+            else:
+                log.error('Command failed', name=str(context.command), error=str(error))
+
         @self.bot.event
         async def on_ready():
+            self.bot.members.build(self.bot.guilds)
             await display.ready(self.bot)
 
+        @self.bot.event
+        async def on_guild_join(guild):
+            self.bot.members.build([guild])
+            display.update_channels(self.bot)
+
+        @self.bot.event
+        async def on_guild_remove(guild):
+            self.bot.members.remove_guild(guild)
+            display.update_channels(self.bot)
+
+        @self.bot.event
+        async def on_guild_channel_create(channel):
+            display.update_channels(self.bot)
+
+        @self.bot.event
+        async def on_guild_channel_delete(channel):
+            display.update_channels(self.bot)
+
+        @self.bot.event
+        async def on_guild_channel_update(before, after):
+            display.update_channels(self.bot)
+
+        @self.bot.event
+        async def on_member_join(member):
+            self.bot.members.add(member)
+
+        @self.bot.event
+        async def on_member_update(before, after):
+            self.bot.members.add(after)
+
+        @self.bot.event
+        async def on_member_remove(member):
+            self.bot.members.remove(member)
+
+        @self.bot.event
+        async def on_user_update(before, after):
+            self.bot.members.update_user(after)
+
         @self.bot.command(description='Show ranking of CTFd (20 first players)')
         async def scoreboard(context: commands.context.Context):
             """ """
@@ -90,4 +161,5 @@ class CTFdBot:
             sys.exit(0)
         self.catch()
         self.bot.loop.create_task(self.cron())
+        self.bot.loop.create_task(metrics.start_server())
         self.bot.run(TOKEN)
@@ -1,13 +1,148 @@
-from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
-from bot.manage.database_data import get_visible_challenges
+import asyncio
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+import discord
+
+from bot import log
+from bot.constants import BOT_CHANNELS, CACHE_SIZE, CATCH_MODE, CTFD_MODE, DB_WORKERS, STATE_PATH
+from bot.database.cache import QueryCache
+from bot.database.source import get_event_source
+from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_scoped_session, get_sqlalchemy_tables
+from bot.database.state import State
+from bot.manage.database_data import get_banned_users, get_ctf_period, get_last_submission_id, get_scoreboard_state, \
+    get_team_members, get_visible_challenges, load_names, load_scoreboard
+from bot.manage.discord_data import is_bot_channel
+from bot.metrics import query_duration
+from bot.profiling import profiler
 
 
 class Database:
 
-    def __init__(self, db_uri):
+    def __init__(self, db_uri: str, state_path: Optional[str] = None, name: str = 'default',
+                 channels: Optional[List[str]] = None, change_feed: Optional[str] = None, mode: str = CTFD_MODE):
+        self.name = name
+        self.channels = BOT_CHANNELS if channels is None else channels
         self.engine, self.base = get_sqlalchemy_engine(db_uri)
-        self.session = get_sqlalchemy_session(self.engine)
-        self.tables = get_sqlalchemy_tables(self.base)
-        self.tag = None  # hash of string composed of last challenge solve user id and challenge id
-        # list of visible challenges ids
-        self.challenges = get_visible_challenges(self.session, self.tables)
+        profiler.instrument(self.engine)
+        self.sessions = get_sqlalchemy_scoped_session(self.engine)
+        self.tables = get_sqlalchemy_tables(self.base, mode=mode)
+        self.executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix='database')
+        self.cache = QueryCache(CACHE_SIZE)
+        self.state = State(state_path, namespace=name)
+        self.state_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='state')  # writes in tick order
+        # states of the cron ticks waiting for their announcements to be sent
+        self.announcing: Deque[Tuple[List[asyncio.Future], Dict[str, Any]]] = deque()
+        self.source = get_event_source(change_feed)  # wakes the cron task of this instance
+        self.source.period = self.execute(get_ctf_period)
+        # watermark: id of the last submission already processed, read before the scoreboard is loaded
+        # solves made while the bot was down are announced by the first cron task
+        self.last_id = self.state.get('last_id')
+        self.gaps = self.state.get('gaps', [])  # ids below the watermark not committed yet when they were read
+        # set of visible challenges ids
+        self.challenges = self.state.get('challenges')
+        last_id = self.execute(get_last_submission_id)
+        if self.last_id is None or self.last_id > last_id:
+            if self.last_id is not None:
+                # the CTFd database was reset or replaced, the saved state belongs to the former one
+                log.warn('Saved state does not match the database', name=name, saved_id=self.last_id, last_id=last_id)
+            self.last_id, self.gaps, self.challenges = last_id, [], None
+        if self.challenges is None:
+            self.challenges = self.execute(get_visible_challenges)
+        self.challenges = set(self.challenges)
+        self.banned_users = self.execute(get_banned_users)
+        # aggregates of the changes missed by the solves stream, solves are counted up to the watermark of the reload
+        self.scoreboard_bound = self.last_id
+        self.scoreboard_state = self.execute(get_scoreboard_state, self.scoreboard_bound)
+        self.scoreboard_loaded = time.monotonic()
+        # updated from the solves detected by the cron task
+        self.scoreboard = self.execute(load_scoreboard, user_type=CATCH_MODE)
+        self.team_members = self.execute(get_team_members)  # team name -> members names, empty in users mode
+        # challenges, categories and users names resolving commands arguments, reloaded with the scoreboard
+        self.names = self.execute(load_names, user_type=CATCH_MODE)
+
+    def execute(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        # short lived session: its connection goes back to the pool and its loaded objects are released
+        try:
+            with profiler.thread_profile(), query_duration.time(query=function.__name__):
+                return function(self.sessions(), self.tables, *args, **kwargs)
+        finally:
+            self.sessions.remove()
+
+    async def query(self, function: Callable, *args: Any, **kwargs: Any) -> Any:
+        # run a bot.manage.database_data function in the executor so the discord gateway loop is never blocked
+        # the context carries the profiling run of the caller to the executor thread
+        loop, context = asyncio.get_event_loop(), contextvars.copy_context()
+        return await loop.run_in_executor(self.executor,
+                                          partial(context.run, self.execute, function, *args, **kwargs))
+
+    async def cached_query(self, function: Callable, *args: Any,
+                           unkeyed: Optional[Callable[[], Dict[str, Any]]] = None, **kwargs: Any) -> Any:
+        """ unkeyed: keyword arguments left out of the cache key and only computed on a miss, they must be derived from
+        a state whose changes invalidate the cache, like the ranked users of the scoreboard
+
+        None results, unknown names, are not cached: the name may be created before the next invalidation
+        """
+        key = self.cache.key(function, args, kwargs)
+        found, result = self.cache.get(key)
+        if found:
+            return result
+        generation = self.cache.generation
+        result = await self.query(function, *args, **kwargs, **(unkeyed() if unkeyed is not None else {}))
+        if result is not None:
+            self.cache.set(key, result, generation)
+        return result
+
+    def get_state(self) -> Dict[str, Any]:
+        return dict(last_id=self.last_id, gaps=list(self.gaps), challenges=sorted(self.challenges))
+
+    def write_state(self, state: Optional[Dict[str, Any]] = None) -> None:
+        for key, value in (self.get_state() if state is None else state).items():
+            self.state.set(key, value)
+
+    async def save_state(self) -> None:
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.state_executor, self.write_state, self.get_state())
+
+    def save_state_once_sent(self, sent: List[asyncio.Future]) -> None:
+        """ saves the current state once the announcements of this tick are done, the cron task does not wait for them
+
+        states are saved in tick order: a restart replays the announcements of the ticks not saved yet
+        """
+        self.announcing.append((sent, self.get_state()))
+        for future in sent:
+            future.add_done_callback(lambda _: self.save_announced())
+        self.save_announced()
+
+    def save_announced(self) -> None:
+        state = None
+        while self.announcing and all(future.done() for future in self.announcing[0][0]):
+            state = self.announcing.popleft()[1]
+        if state is not None:
+            asyncio.get_event_loop().run_in_executor(self.state_executor, self.write_state, state)
+
+
+class Databases:
+
+    def __init__(self, instances: Dict[str, Dict]) -> None:
+        """ registry of CTFd instances, each one with its own engine, watermark, state and channels
+
+        instances share STATE_PATH unless they set their own state_path, None keeps their state in memory
+        """
+        self.databases = {name: Database(instance['db_uri'], state_path=instance.get('state_path', STATE_PATH),
+                                         name=name, channels=instance.get('channels'),
+                                         change_feed=instance.get('change_feed'), mode=instance.get('mode', CTFD_MODE))
+                          for name, instance in instances.items()}
+
+    def __iter__(self) -> Iterator[Database]:
+        return iter(self.databases.values())
+
+    def get(self, channel: discord.abc.GuildChannel) -> Optional[Database]:
+        for db in self:
+            if is_bot_channel(channel, db.channels):
+                return db
+        return None
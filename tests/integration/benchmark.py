@@ -0,0 +1,135 @@
+""" benchmark of bot.manage.database_data functions and of the cron task on synthetic CTFd databases
+
+usage: python benchmark.py [--sizes 100 1000 10000] [--repeat 3], from tests/integration with the repository in
+PYTHONPATH
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
+from bot.display.show import display_cron, display_parts, display_scoreboard
+from bot.manage import database_data
+from dataset import FIRST_ID, build_database
+from db import Database
+
+NEW_SOLVES = 100  # solves announced by the cron benchmark
+
+# database_data function -> (args, kwargs), the session and tables are given by the suite
+BENCHMARKS: Dict[Callable, Tuple[Tuple, Dict]] = {
+    database_data.get_ctf_name: ((), {}),
+    database_data.get_ctf_period: ((), {}),
+    database_data.get_false_submissions: ((), {}),
+    database_data.get_visible_challenges: ((), {}),
+    database_data.get_challenge_info: ((FIRST_ID,), {}),
+    database_data.get_visible_challenges_fingerprint: ((), {}),
+    database_data.get_challenges_info: ((list(range(FIRST_ID, FIRST_ID + 10)),), {}),
+    database_data.get_scoreboard_solves: ((), {}),
+    database_data.get_dynamic_challenges: ((), {}),
+    database_data.get_awards: ((), {}),
+    database_data.get_dynamic_solves: ((), {}),
+    database_data.load_scoreboard: ((), {}),
+    database_data.get_scoreboard: ((), {}),
+    database_data.get_banned_users: ((), {}),
+    database_data.get_scoreboard_state: ((), {}),
+    database_data.get_users: ((), {}),
+    database_data.get_team_members: ((), {}),
+    database_data.load_names: ((), {}),
+    database_data.get_categories: ((), {}),
+    database_data.category_exists: (('Category0',), {}),
+    database_data.get_category_info: (('Category0',), {}),
+    database_data.user_exists: ((f'bench{FIRST_ID}',), {}),
+    database_data.challenge_exists: ((f'bench{FIRST_ID}',), {}),
+    database_data.get_authors_challenge: ((f'bench{FIRST_ID}',), {}),
+    database_data.get_users_solved_challenge: ((f'bench{FIRST_ID}',), {}),
+    database_data.get_challenges_solved_during: ((1,), {}),
+    database_data.get_solved_challenges: (([f'bench{FIRST_ID}', f'bench{FIRST_ID + 1}'],), {}),
+    database_data.challenges_solved_by_user: ((f'bench{FIRST_ID}',), {}),
+    database_data.diff: ((f'bench{FIRST_ID}', f'bench{FIRST_ID + 1}'), {}),
+    database_data.track_user: ((f'bench{FIRST_ID}',), {}),
+    database_data.get_challenges_solved: ((), {}),
+    database_data.get_last_submission_id: ((), {}),
+    database_data.get_submissions_since: ((0,), {}),
+    database_data.get_new_challenges: ((0,), {}),
+}
+
+
+def get_database_functions() -> List[Callable]:
+    """ public queries of bot.manage.database_data, all of them must be benchmarked """
+    return [function for name, function in inspect.getmembers(database_data, inspect.isfunction)
+            if function.__module__ == database_data.__name__ and not name.startswith('_')
+            and list(inspect.signature(function).parameters)[:1] == ['s']]
+
+
+def timed(function: Callable, *args, repeat: int = 3, **kwargs) -> float:
+    """ best duration of <repeat> calls """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args, **kwargs)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def benchmark_database(db_uri: str, repeat: int = 3) -> Dict[str, float]:
+    engine, base = get_sqlalchemy_engine(db_uri)
+    tables = get_sqlalchemy_tables(base)
+    results = dict()
+    for function, (args, kwargs) in BENCHMARKS.items():
+        session = get_sqlalchemy_session(engine)
+        results[function.__name__] = timed(function, session, tables, *args, repeat=repeat, **kwargs)
+        session.close()
+    return results
+
+
+def benchmark_cron(db_uri: str, repeat: int = 3) -> Dict[str, float]:
+    """ idle cron tick, tick announcing NEW_SOLVES solves and display of the complete scoreboard """
+    db = Database(db_uri)
+    last_id = db.last_id
+
+    def tick(start_id: int):
+        db.last_id = start_id
+        return asyncio.run(display_cron(db))
+
+    def scoreboard():
+        return display_parts(asyncio.run(display_scoreboard(db, all_players=True)))
+
+    return {
+        'cron_idle': timed(tick, last_id, repeat=repeat),
+        'cron_new_solves': timed(tick, max(last_id - NEW_SOLVES, 0), repeat=repeat),
+        'display_scoreboard': timed(scoreboard, repeat=repeat),
+    }
+
+
+def run(sizes: List[int], repeat: int = 3, directory: str = None) -> Dict[int, Dict[str, float]]:
+    """ size: number of players, each one solving 10 challenges out of 50 (5 dynamic) with 2 wrong flags """
+    results = dict()
+    with tempfile.TemporaryDirectory(dir=directory) as path:
+        for size in sizes:
+            db_uri = build_database(os.path.join(path, f'{size}.db'), users=size, dynamic=5, wrong_per_user=2,
+                                    tracking_per_user=2)
+            results[size] = benchmark_database(db_uri, repeat=repeat)
+            results[size].update(benchmark_cron(db_uri, repeat=repeat))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000], help='number of players')
+    parser.add_argument('--repeat', type=int, default=3, help='calls per measure, the best one is kept')
+    args = parser.parse_args()
+
+    results = run(args.sizes, repeat=args.repeat)
+    names = list(results[args.sizes[0]])
+    width = max(len(name) for name in names)
+    print(f'{"":{width}}' + ''.join(f'{size:>12}' for size in args.sizes))
+    for name in names:
+        print(f'{name:{width}}' + ''.join(f'{results[size][name] * 1000:>10.2f}ms' for size in args.sizes))
+
+
+if __name__ == '__main__':
+    main()
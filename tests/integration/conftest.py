@@ -0,0 +1,54 @@
+import shutil
+from typing import Callable, Iterator, Tuple
+
+import pytest
+from sqlalchemy.orm import Session
+
+from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
+from bot.database.tables import CTFdTables
+from db import Database
+
+
+@pytest.fixture(scope='session')
+def db_uri() -> str:
+    return 'sqlite:///ctfd.db'
+
+
+@pytest.fixture(scope='session')
+def engine_base(db_uri: str) -> Tuple:
+    return get_sqlalchemy_engine(db_uri)
+
+
+@pytest.fixture
+def session(engine_base: Tuple) -> Session:
+    engine, base = engine_base
+    return get_sqlalchemy_session(engine)
+
+
+@pytest.fixture
+def tables(engine_base: Tuple) -> CTFdTables:
+    engine, base = engine_base
+    return get_sqlalchemy_tables(base)
+
+
+@pytest.fixture
+def ctfd_path(tmp_path) -> str:
+    """ copy of ctfd.db for the tests editing the CTFd database """
+    path = str(tmp_path / 'ctfd.db')
+    shutil.copy('ctfd.db', path)
+    return path
+
+
+@pytest.fixture
+def database(db_uri: str) -> Iterator[Callable[..., Database]]:
+    """ builds Database instances, their executors are shut down after the test """
+    databases = []
+
+    def build(uri: str = db_uri, **kwargs) -> Database:
+        databases.append(Database(uri, **kwargs))
+        return databases[-1]
+
+    yield build
+    for db in databases:
+        db.executor.shutdown()
+        db.state_executor.shutdown()
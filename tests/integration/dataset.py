@@ -0,0 +1,82 @@
+import datetime
+import shutil
+import sqlite3
+from typing import List, Tuple
+
+FIRST_ID = 100  # rows of ./ctfd.db are kept, generated rows start at this id
+
+
+def build_database(path: str, users: int = 100, teams: int = 0, challenges: int = 50, dynamic: int = 0,
+                   solves_per_user: int = 10, wrong_per_user: int = 0, tracking_per_user: int = 0,
+                   hours: int = 1) -> str:
+    """ copy of ./ctfd.db (CTFd 2.1 schema) filled with a synthetic event
+
+    users: players named bench<id>, split between <teams> teams bench_team<id> when teams is not 0
+    challenges: visible challenges bench<id> in 5 categories, the first <dynamic> ones are dynamic
+    solves_per_user: correct submissions of every player on distinct challenges, unless a teammate already solved it
+    wrong_per_user: incorrect submissions of every player
+    tracking_per_user: distinct ips of every player
+    hours: submissions are spread over the last <hours> hours
+    """
+    assert solves_per_user <= challenges
+    shutil.copy('ctfd.db', path)
+    now = datetime.datetime.now()
+    users_id = range(FIRST_ID, FIRST_ID + users)
+    teams_id = range(FIRST_ID, FIRST_ID + teams)
+    challenges_id = range(FIRST_ID, FIRST_ID + challenges)
+
+    def team(user_id: int):
+        return teams_id[user_id % teams] if teams else None
+
+    with sqlite3.connect(path) as connection:
+        connection.executemany(
+            'INSERT INTO challenges (id, name, description, max_attempts, value, category, type, state) '
+            'VALUES (?, ?, ?, 0, ?, ?, ?, "visible")',
+            [(id, f'bench{id}', f'Flag of bench{id}\r\n\r\nAuthor: @author{id % 10}#{1000 + id % 10}', 10 * id,
+              f'Category{id % 5}', 'dynamic' if id - FIRST_ID < dynamic else 'standard') for id in challenges_id]
+        )
+        connection.executemany(
+            'INSERT INTO dynamic_challenge (id, initial, minimum, decay) VALUES (?, 500, 100, ?)',
+            [(id, max(users // 2, 1)) for id in challenges_id[:dynamic]]
+        )
+        connection.executemany(
+            'INSERT INTO teams (id, name, email, hidden, banned, created) VALUES (?, ?, ?, 0, 0, ?)',
+            [(id, f'bench_team{id}', f'bench_team{id}@example.org', now) for id in teams_id]
+        )
+        connection.executemany(
+            'INSERT INTO users (id, name, email, type, hidden, banned, verified, team_id, created) '
+            'VALUES (?, ?, ?, "user", 0, 0, 0, ?, ?)',
+            [(id, f'bench{id}', f'bench{id}@example.org', team(id), now) for id in users_id]
+        )
+
+        # players submit in rounds, each one trying a flag before solving the challenge
+        # in teams mode a challenge is solved once per team
+        submissions: List[Tuple] = []
+        solved = set()
+        for i in range(max(solves_per_user, wrong_per_user)):
+            for user_id in users_id:
+                challenge_id = challenges_id[(user_id + i) % challenges]
+                if i < wrong_per_user:
+                    submissions.append((challenge_id, user_id, 'incorrect'))
+                if i < solves_per_user and (challenge_id, team(user_id) or user_id) not in solved:
+                    solved.add((challenge_id, team(user_id) or user_id))
+                    submissions.append((challenge_id, user_id, 'correct'))
+        step = datetime.timedelta(hours=hours) / max(len(submissions), 1)
+        first_id = connection.execute('SELECT MAX(id) FROM submissions').fetchone()[0] + 1
+        connection.executemany(
+            'INSERT INTO submissions (id, challenge_id, user_id, team_id, ip, provided, type, date) '
+            'VALUES (?, ?, ?, ?, "127.0.0.1", "flag", ?, ?)',
+            [(first_id + n, challenge_id, user_id, team(user_id), submission_type,
+              now - datetime.timedelta(hours=hours) + n * step)
+             for n, (challenge_id, user_id, submission_type) in enumerate(submissions)]
+        )
+        connection.execute(
+            'INSERT INTO solves (id, challenge_id, user_id, team_id) SELECT id, challenge_id, user_id, team_id '
+            'FROM submissions WHERE id >= ? AND type = "correct"', (first_id,)
+        )
+        connection.executemany(
+            'INSERT INTO tracking (ip, user_id, date) VALUES (?, ?, ?)',
+            [(f'10.{user_id // 256 % 256}.{user_id % 256}.{i % 256}', user_id, now) for user_id in users_id
+             for i in range(tracking_per_user)]
+        )
+    return f'sqlite:///{path}'
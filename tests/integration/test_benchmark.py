@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterator, List, Tuple
+
+import pytest
+from sqlalchemy import desc, event
+from sqlalchemy.orm import Session
+
+from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
+from bot.database.tables import CTFdTables
+from bot.manage import database_data
+from bot.manage.database_data import diff, get_challenges_solved, get_challenges_solved_during, get_users, \
+    get_users_solved_challenge
+import benchmark
+from dataset import build_database
+
+CHALLENGES = 50
+# timing checks depend on the load of the machine, they are only run with BENCHMARK=1
+timing = pytest.mark.skipif(not os.environ.get('BENCHMARK'), reason='timing check, set BENCHMARK=1 to run it')
+
+
+def connect(db_uri: str) -> Tuple[Session, CTFdTables]:
+    engine, base = get_sqlalchemy_engine(db_uri)
+    return get_sqlalchemy_session(engine), get_sqlalchemy_tables(base)
+
+
+def timed(function: Callable, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def executed(function: Callable, session: Session, *args, **kwargs) -> List[str]:
+    """ statements executed by a call """
+    statements = []
+
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(session.bind, 'before_cursor_execute', before_cursor_execute)
+    try:
+        function(session, *args, **kwargs)
+    finally:
+        event.remove(session.bind, 'before_cursor_execute', before_cursor_execute)
+    return statements
+
+
+class ScannedList(list):
+    """ list counting the items read by loops and membership tests """
+
+    def __init__(self, *args) -> None:
+        super().__init__(*args)
+        self.scanned = 0
+
+    def __iter__(self) -> Iterator:
+        for item in super().__iter__():
+            self.scanned += 1
+            yield item
+
+    def __contains__(self, item) -> bool:
+        return any(element == item for element in self)
+
+
+def visited(function: Callable, session: Session, *args, users: List[str], **kwargs) -> int:
+    """ lines run in bot.manage.database_data and users scanned by a call, unlike durations it does not depend on the
+    load of the machine
+    """
+    users, lines = ScannedList(users), 0
+
+    def trace(frame, event, arg):
+        nonlocal lines
+        if frame.f_globals.get('__name__') != database_data.__name__:
+            return None
+        if event == 'line':
+            lines += 1
+        return trace
+
+    sys.settrace(trace)
+    try:
+        function(session, *args, users=users, **kwargs)
+    finally:
+        sys.settrace(None)
+    return lines + users.scanned
+
+
+def traced(function: Callable, *args, **kwargs) -> int:
+    """ memory peak of a call """
+    tracemalloc.start()
+    try:
+        function(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture(scope='module')
+def databases(tmp_path_factory) -> Tuple[Tuple[Session, CTFdTables], Tuple[Session, CTFdTables]]:
+    path = tmp_path_factory.mktemp('benchmark')
+    return connect(build_database(str(path / 'small.db'), users=200)), \
+        connect(build_database(str(path / 'large.db'), users=2000))
+
+
+def assert_statements(databases, function: Callable, *args, **kwargs) -> None:
+    # 10 times more players (and solves) must not issue more statements, the ranks come from the given users
+    (small_session, small_tables), (large_session, large_tables) = databases
+    small_users = get_users(small_session, small_tables, user_type='all')
+    large_users = get_users(large_session, large_tables, user_type='all')
+    small = executed(function, small_session, small_tables, *args, users=small_users, **kwargs)
+    large = executed(function, large_session, large_tables, *args, users=large_users, **kwargs)
+    assert 1 == len(small)
+    assert small == large
+
+
+def assert_visited(databases, function: Callable, *args, **kwargs) -> None:
+    # 10 times more players (and solves) must not visit 100 times more items as with the former nested loops
+    (small_session, small_tables), (large_session, large_tables) = databases
+    small_users = get_users(small_session, small_tables, user_type='all')
+    large_users = get_users(large_session, large_tables, user_type='all')
+    small = visited(function, small_session, small_tables, *args, users=small_users, **kwargs)
+    large = visited(function, large_session, large_tables, *args, users=large_users, **kwargs)
+    assert large < 20 * small
+
+
+def assert_linear(databases, function: Callable, *args, **kwargs) -> None:
+    # 10 times more players (and solves) must not cost 100 times more as with the former list scans
+    (small_session, small_tables), (large_session, large_tables) = databases
+    small_users = get_users(small_session, small_tables, user_type='all')
+    large_users = get_users(large_session, large_tables, user_type='all')
+    small = min(timed(function, small_session, small_tables, *args, users=small_users, **kwargs) for _ in range(3))
+    large = min(timed(function, large_session, large_tables, *args, users=large_users, **kwargs) for _ in range(3))
+    assert large < 30 * small
+
+
+@pytest.mark.parametrize('function, args', [(get_users_solved_challenge, ('bench100',)),
+                                            (get_challenges_solved_during, (1,)),
+                                            (diff, ('bench100', 'bench101'))])
+def test_benchmark_statements(databases, function: Callable, args: Tuple):
+    assert_statements(databases, function, *args, user_type='all')
+
+
+@pytest.mark.parametrize('function, args', [(get_users_solved_challenge, ('bench100',)),
+                                            (get_challenges_solved_during, (1,)),
+                                            (diff, ('bench100', 'bench101'))])
+def test_benchmark_visited(databases, function: Callable, args: Tuple):
+    assert_visited(databases, function, *args, user_type='all')
+
+
+@timing
+def test_benchmark_users_solved_challenge(databases):
+    assert_linear(databases, get_users_solved_challenge, 'bench100', user_type='all')
+
+
+@timing
+def test_benchmark_challenges_solved_during(databases):
+    assert_linear(databases, get_challenges_solved_during, 1, user_type='all')
+
+
+@timing
+def test_benchmark_diff(databases):
+    assert_linear(databases, diff, 'bench100', 'bench101', user_type='all')
+
+
+def get_challenges_solved_entities(s: Session, tables: CTFdTables, user_type: str = 'all') -> List[Tuple]:
+    # former implementation, mapped submissions and their related users and challenges are loaded
+    challenges = s.query(tables.submissions). \
+        join(tables.challenges, tables.challenges.id == tables.submissions.challenge_id). \
+        join(tables.users, tables.users.id == tables.submissions.user_id). \
+        filter(tables.submissions.type == 'correct')
+    if user_type != 'all':
+        challenges = challenges.filter(tables.users.type == user_type)
+    return [(item.id, item.date, item.users.name, item.challenges.name, item.challenges.value)
+            for item in challenges.order_by(desc(tables.submissions.date)).all()]
+
+
+def test_column_loading():
+    session, tables = connect('sqlite:///ctfd.db')
+    statements = executed(get_challenges_solved, session, tables, user_type='all')
+    assert 1 == len(statements)
+    columns = ' '.join(statements[0].split()).split(' FROM ')[0].replace('SELECT ', '').split(', ')
+    # only the columns of the announcements, no mapped entity
+    assert ['submissions.id AS submissions_id', 'submissions.date AS submissions_date', 'users.name AS username',
+            'challenges.name AS challenge', 'challenges.value AS challenges_value'] == columns
+
+
+def test_benchmark_column_loading(tmp_path):
+    # 2000 players solving every challenge, 100k submissions
+    db_uri = build_database(str(tmp_path / 'submissions.db'), users=2000, challenges=CHALLENGES,
+                            solves_per_user=CHALLENGES)
+    engine, base = get_sqlalchemy_engine(db_uri)
+    tables = get_sqlalchemy_tables(base)
+    results = []
+    for function in (get_challenges_solved_entities, get_challenges_solved):
+        session = get_sqlalchemy_session(engine)
+        results.append(traced(function, session, tables, user_type='all'))
+        session.close()
+    entities_memory, columns_memory = results
+    assert columns_memory < entities_memory / 2
+
+
+def test_benchmark_suite(tmp_path):
+    assert set(benchmark.get_database_functions()) == set(benchmark.BENCHMARKS)
+    results = benchmark.run([20], repeat=1, directory=str(tmp_path))
+    assert set(results[20]) == {function.__name__ for function in benchmark.BENCHMARKS} | \
+        {'cron_idle', 'cron_new_solves', 'display_scoreboard'}
+    assert all(duration > 0 for duration in results[20].values())
+
+
+def test_dataset_teams(tmp_path):
+    engine, base = get_sqlalchemy_engine(build_database(str(tmp_path / 'teams.db'), users=30, teams=10, challenges=10,
+                                                        dynamic=2, wrong_per_user=1, tracking_per_user=2))
+    tables = get_sqlalchemy_tables(base)
+    session = get_sqlalchemy_session(engine)
+    assert session.query(tables.dynamic_challenge).count() == 2
+    assert session.query(base.classes.teams).count() == 10
+    assert session.query(tables.tracking).count() == 3 + 30 * 2
+    # the 3 players of a team try the same challenge in each of the 10 rounds, only one solve is kept
+    assert session.query(tables.solves).filter(tables.solves.id > 4).count() == 10 * 30 // 3
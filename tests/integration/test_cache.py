@@ -0,0 +1,72 @@
+import asyncio
+
+from bot.database.cache import QueryCache
+from bot.display.show import display_who_solved, update_scoreboard
+from bot.manage import database_data
+
+
+def test_query_cache_lru():
+    cache = QueryCache(2)
+    for i in range(3):
+        cache.set(i, i * 10, cache.generation)
+    assert (False, None) == cache.get(0)  # evicted
+    assert (True, 10) == cache.get(1)
+    cache.set(3, 30, cache.generation)
+    assert (False, None) == cache.get(2)  # least recently used
+    assert (True, 10) == cache.get(1)
+    assert (2, 2) == (cache.hits, cache.misses)
+
+
+def test_query_cache_invalidate():
+    cache = QueryCache(2)
+    generation = cache.generation
+    cache.invalidate()
+    cache.set('key', 'stale', generation)  # computed before the invalidation
+    assert (False, None) == cache.get('key')
+
+
+def test_cached_query(database):
+    db = database()
+
+    async def run():
+        for _ in range(3):
+            assert ['Category1', 'Category2'] == await db.cached_query(database_data.get_categories)
+        assert await db.cached_query(database_data.challenge_exists, 'Challenge1')
+        assert not await db.cached_query(database_data.challenge_exists, 'Challenge42')
+
+    asyncio.run(run())
+    assert (2, 3) == (db.cache.hits, db.cache.misses)
+    db.cache.invalidate()
+    assert 0 == len(db.cache.entries)
+
+
+def test_cached_query_unkeyed(database):
+    db = database()
+    computed = []
+
+    def users():
+        computed.append(1)
+        return dict(users=db.scoreboard.get_users())
+
+    async def run():
+        for _ in range(3):
+            assert ['zTeeed', 'user1'] == await db.cached_query(database_data.get_users_solved_challenge, 'Challenge1',
+                                                                user_type='all', unkeyed=users)
+
+    asyncio.run(run())
+    assert 1 == len(computed)  # only on the miss
+    assert [('bot.manage.database_data', 'get_users_solved_challenge', ('Challenge1',), (('user_type', 'all'),))] == \
+        list(db.cache.entries)
+
+
+def test_cache_during_reload(database):
+    db = database()
+
+    async def run():
+        reload = asyncio.ensure_future(update_scoreboard(db))
+        await asyncio.sleep(0)  # the reload is waiting for its queries
+        await display_who_solved(db, 'Challenge1')  # ranked with the former scoreboard
+        await reload
+
+    asyncio.run(run())
+    assert {} == db.cache.entries
@@ -0,0 +1,66 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List
+
+import discord
+
+import bot.manage.channel_data as channel_data
+
+
+class Message(SimpleNamespace):
+
+    async def delete(self) -> None:
+        self.channel.deleted.append(self)
+
+
+class Channel(SimpleNamespace):
+
+    async def history(self, limit=None):
+        for message in sorted(self.messages, key=lambda m: m.created_at, reverse=True)[:limit]:
+            yield message
+
+    async def delete_messages(self, messages: List[Message]) -> None:
+        assert len(messages) <= 100
+        assert all(datetime.utcnow() - message.created_at < timedelta(days=14) for message in messages)
+        self.bulk.append(len(messages))
+        self.deleted += messages
+
+
+def get_message(channel: Channel, age: timedelta, title: str = None) -> Message:
+    embeds = [] if title is None else [SimpleNamespace(fields=[SimpleNamespace(name=title)])]
+    message = Message(channel=channel, created_at=datetime.utcnow() - age, embeds=embeds)
+    channel.messages.append(message)
+    return message
+
+
+def test_flush(monkeypatch):
+    monkeypatch.setattr(channel_data, 'FLUSH_DELETE_PERIOD', 0)
+    monkeypatch.setattr(channel_data, 'FLUSH_PROGRESS', 100)
+    channel = Channel(messages=[], deleted=[], bulk=[])
+    kept = [get_message(channel, timedelta(seconds=1), 'FLUSH'),
+            get_message(channel, timedelta(days=20), 'New challenge solved by user1')]
+    flush_message = get_message(channel, timedelta(hours=1), 'FLUSH')
+    recent = [get_message(channel, timedelta(minutes=i + 2)) for i in range(250)]
+    old = [get_message(channel, timedelta(days=15 + i), 'New challenge available') for i in range(3)]
+
+    progress = []
+
+    async def report(deleted: int) -> None:
+        progress.append(deleted)
+
+    assert 254 == asyncio.run(channel_data.flush(channel, progress=report))
+    assert [100, 100, 51] == channel.bulk
+    assert {id(m) for m in recent + old + [flush_message]} == {id(m) for m in channel.deleted}
+    assert not {id(m) for m in kept} & {id(m) for m in channel.deleted}
+    assert [100, 200] == progress
+
+
+def test_flush_error():
+    async def delete_messages(messages):
+        raise discord.HTTPException(SimpleNamespace(status=403, reason='Forbidden'), 'Missing Permissions')
+
+    channel = Channel(messages=[], deleted=[], bulk=[])
+    channel.delete_messages = delete_messages
+    get_message(channel, timedelta(minutes=1))
+    assert asyncio.run(channel_data.flush(channel)) is None
@@ -0,0 +1,62 @@
+from types import SimpleNamespace
+
+import bot.manage.discord_data as discord_data
+
+
+class Channel(SimpleNamespace):
+
+    def __str__(self) -> str:
+        return self.name
+
+
+class Member(SimpleNamespace):
+
+    def __str__(self) -> str:
+        return f'{self.name}#{self.discriminator}'
+
+
+def test_bot_channels(monkeypatch):
+    monkeypatch.setattr(discord_data, 'CTFD_INSTANCES', {
+        'first': dict(channels=['ctf-news']),
+        'second': dict(channels=['Community/events'])
+    })
+    news = Channel(name='ctf-news', guild='Community')
+    events = Channel(name='events', guild='Community')
+    other_events = Channel(name='events', guild='Other')
+    general = Channel(name='general', guild='Other')
+    bot = SimpleNamespace(guilds=[
+        SimpleNamespace(text_channels=[news, events]),
+        SimpleNamespace(text_channels=[other_events, general, Channel(name='ctf-news', guild='Other')])
+    ])
+
+    assert discord_data.is_bot_channel(news)
+    assert discord_data.is_bot_channel(events)
+    assert not discord_data.is_bot_channel(other_events)
+    assert not discord_data.is_bot_channel(general)
+    assert ['Community/ctf-news', 'Community/events', 'Other/ctf-news'] == \
+           [f'{channel.guild}/{channel}' for channel in discord_data.get_channels(bot)]
+    assert [events] == discord_data.get_channels(bot, ['Community/events'])
+
+
+def test_member_index():
+    guild, other = SimpleNamespace(id=1), SimpleNamespace(id=2)
+    symlink = Member(id=10, name='SymLiNK', discriminator='2835', guild=guild)
+    zteeed = Member(id=11, name='zTeeed', discriminator='1234', guild=guild)
+    guild.members, other.members = [symlink, zteeed], [Member(id=10, name='SymLiNK', discriminator='2835', guild=other)]
+    members = discord_data.MemberIndex()
+    members.build([guild, other])
+    assert symlink is members.get(guild, 'SymLiNK#2835')
+    assert zteeed is members.get(guild, 11)
+    assert members.get(other, 'zTeeed#1234') is None
+
+    symlink.name = 'SymLiNK2'  # discord updates the user in place
+    members.update_user(symlink)
+    assert members.get(guild, 'SymLiNK#2835') is None
+    assert symlink is members.get(guild, 'SymLiNK2#2835')
+
+    members.remove(zteeed)
+    assert members.get(guild, 'zTeeed#1234') is None and members.get(guild, 11) is None
+    members.add(Member(id=12, name='new', discriminator='0001', guild=guild))
+    assert 12 == members.get(guild, 'new#0001').id
+    members.remove_guild(other)
+    assert members.get(other, 10) is None
@@ -0,0 +1,111 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+
+import bot.display.embed as embed
+from bot.display.dispatcher import Dispatcher
+
+
+class Channel:
+
+    def __init__(self, id: int) -> None:
+        self.id = id
+        self.messages: List = []
+
+    async def send(self, content=None, embed=None) -> None:
+        self.messages.append(content if embed is None else embed)
+
+
+class NamedChannel(Channel):
+
+    def __init__(self, id: int, name: str) -> None:
+        super().__init__(id)
+        self.name = name
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def test_dispatcher_packs_messages():
+    channel = Channel(1)
+
+    async def run():
+        dispatcher = Dispatcher()
+        for i in range(30):
+            dispatcher.put(channel, f' • Challenge{i}', embed_name=f'New challenge solved by user{i}',
+                           embed_color=0xFFCC00)
+        dispatcher.put(channel, ' • Challenge42', embed_name='New challenge available', embed_color=0x16B841)
+        dispatcher.put(channel, 'Ping: @user1')
+        dispatcher.put(channel, 'Ping: @user2')
+        await dispatcher.join()
+
+    asyncio.run(run())
+    # embeds are packed up to 25 fields, a different color starts a new message
+    assert [25, 5, 1] == [len(message.fields) for message in channel.messages[:3]]
+    assert 'New challenge solved by user0' == channel.messages[0].fields[0].name
+    assert 'New challenge available' == channel.messages[2].fields[0].name
+    assert 'Ping: @user1\nPing: @user2' == channel.messages[3]
+    assert 4 == len(channel.messages)
+
+
+def test_dispatcher_rate_limit(monkeypatch):
+    channel = Channel(1)
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    async def run():
+        dispatcher = Dispatcher()
+        monkeypatch.setattr(asyncio, 'sleep', sleep)
+        for i in range(6):
+            dispatcher.put(channel, 'Ping', embed_name='Embed', embed_color=i)  # colors prevent packing
+        await dispatcher.join()
+
+    asyncio.run(run())
+    assert 6 == len(channel.messages)
+    assert 1 == len(delays)  # the 6th message waits for the rate limit bucket
+
+
+def test_dispatcher_sent():
+    channel, closed = Channel(1), Channel(2)
+
+    async def send(content=None, embed=None):
+        raise ConnectionError('closed')
+
+    closed.send = send
+
+    async def run():
+        dispatcher = Dispatcher()
+        sent = [dispatcher.put(channel, 'Ping'), dispatcher.put(closed, 'Ping')]
+        return await asyncio.gather(*sent)
+
+    assert [True, False] == asyncio.run(run())
+
+
+def test_cron_saves_state_once_sent(database, tmp_path, monkeypatch):
+    monkeypatch.setattr(embed, 'dispatcher', Dispatcher())
+    db = database(state_path=str(tmp_path / 'state.db'))
+    db.last_id = 0
+    channel = NamedChannel(3, 'ctf-news')
+    sending = asyncio.Event()
+
+    async def send(content=None, embed=None):
+        await sending.wait()
+
+    channel.send = send
+    bot = SimpleNamespace(channels=[channel])
+
+    async def saved():
+        await asyncio.sleep(0)  # done callbacks of the futures
+        return await asyncio.get_event_loop().run_in_executor(db.state_executor, db.state.get, 'last_id')
+
+    async def run():
+        await embed.cron(bot, db)  # returns while its announcements are still queued
+        await embed.cron(bot, db)  # idle tick, saved after the former one
+        assert await saved() is None
+        sending.set()
+        await embed.dispatcher.join()
+        assert 4 == await saved()
+
+    asyncio.run(run())
@@ -0,0 +1,20 @@
+from bot.display.show import display_parts
+
+
+def test_display_parts():
+    assert ['\n'] == display_parts('')
+    assert ['a\nb\n'] == display_parts('a\nb')
+    assert ['a\nb\n'] == display_parts(iter(['a', 'b']))
+
+
+def test_display_parts_limit():
+    lines = [f'{i:04d}' for i in range(1000)]
+    parts = display_parts(lines, limit=1024)
+    assert all(len(part) <= 1024 for part in parts)
+    assert 5 == len(parts)  # 204 lines of 5 characters per part
+    assert ''.join(parts) == ''.join(f'{line}\n' for line in lines)
+
+
+def test_display_parts_long_line():
+    parts = display_parts('short\n' + 'x' * 2500, limit=1024)
+    assert ['short\n', 'x' * 1023 + '\n', 'x' * 1023 + '\n', 'x' * 454 + '\n'] == parts
@@ -0,0 +1,68 @@
+import asyncio
+import socket
+
+import aiohttp
+import pytest
+
+from bot import metrics
+from bot.manage import database_data
+from bot.metrics import Metric, Registry
+
+
+def test_registry():
+    registry = Registry()
+    requests = registry.counter('requests_total', 'Requests.', ['name'])
+    depth = registry.gauge('depth', 'Depth.')
+    duration = registry.histogram('duration_seconds', 'Duration.', ['name'], buckets=(0.1, 1))
+    requests.inc(name='scoreboard')
+    requests.inc(2, name='scoreboard')
+    depth.set(3)
+    for value in (0.05, 0.5, 5):
+        duration.observe(value, name='scoreboard')
+
+    lines = registry.render().split('\n')
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{name="scoreboard"} 3' in lines
+    assert 'depth 3' in lines
+    assert 'duration_seconds_bucket{name="scoreboard",le="0.1"} 1' in lines
+    assert 'duration_seconds_bucket{name="scoreboard",le="1"} 2' in lines
+    assert 'duration_seconds_bucket{name="scoreboard",le="+Inf"} 3' in lines
+    assert 'duration_seconds_count{name="scoreboard"} 3' in lines
+
+
+def test_registry_disabled():
+    registry = Registry(enabled=False)
+    duration = registry.histogram('duration_seconds', 'Duration.')
+    with duration.time():
+        pass
+    registry.gauge('depth', 'Depth.').set(1)
+    assert {} == duration.values
+    assert 'depth' not in registry.render().split('\n')
+
+
+def test_metric_abstract():
+    with pytest.raises(TypeError):
+        Metric(Registry(), 'untyped', 'Untyped.')
+
+
+def test_query_duration(database, monkeypatch):
+    monkeypatch.setattr(metrics.registry, 'enabled', True)
+    db = database()
+    asyncio.run(db.query(database_data.get_scoreboard, user_type='all'))
+    assert 1 == metrics.query_duration.values[('get_scoreboard',)][2]
+
+
+def test_server():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    async def run():
+        await metrics.start_server('127.0.0.1', port)
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f'http://127.0.0.1:{port}/metrics') as response:
+                return response.status, await response.text()
+
+    status, text = asyncio.run(run())
+    assert 200 == status
+    assert '# TYPE ctfd_query_seconds histogram' in text
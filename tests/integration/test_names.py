@@ -0,0 +1,86 @@
+import asyncio
+import sqlite3
+
+from sqlalchemy import event
+
+from bot.display.show import display_category, display_cron, display_diff, display_who_solved
+from bot.manage.names import NameIndex
+
+
+def test_resolve():
+    names = NameIndex(['Web Login', 'web200', 'Pwn1', 'Pwn2'])
+    assert 'Web Login' == names.resolve('Web Login')
+    assert 'web200' == names.resolve('WEB200')
+    assert 'Web Login' == names.resolve('web l')
+    assert names.resolve('pwn') is None  # ambiguous
+    assert names.resolve('crypto') is None
+    names.add('Crypto Warmup')
+    assert 'Crypto Warmup' == names.resolve('crypto')
+    assert 5 == len(names)
+
+
+def test_suggest():
+    names = NameIndex(['Web Login', 'web200', 'Pwn1', 'Pwn2', 'Crypto Warmup'])
+    assert ['Pwn1', 'Pwn2'] == names.suggest('pwn')
+    assert ['Crypto Warmup'] == names.suggest('crytpo warmup')
+    assert ['Web Login'] == names.suggest('Web Logn')
+    assert [] == names.suggest('forensic')
+    assert ['Pwn1'] == names.suggest('pwn', limit=1)
+
+
+def test_display_names(database):
+    db = database()
+    assert {'Challenge1', 'Challenge2'} == set(db.names['challenges'].names['challenge1'] +
+                                              db.names['challenges'].names['challenge2'])
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    assert 'Challenge Challenge3 does not exists. Did you mean Challenge1 or Challenge2?' == \
+           asyncio.run(display_who_solved(db, 'Challenge3'))
+    assert 'Category web does not exists.' == asyncio.run(display_category(db, 'web'))
+    assert [{'user': 'user3', 'msg': 'User user3 does not exists. Did you mean user1 or user2?'}] == \
+           asyncio.run(display_diff(db, 'USER1', 'user3'))
+    assert [] == statements  # unknown names are answered without queries
+
+    assert ' • user2\n' == asyncio.run(display_who_solved(db, 'challenge2'))
+    assert ['user1', 'zTeeed'] == [item['user'] for item in asyncio.run(display_diff(db, 'USER1', 'zteeed'))]
+
+
+def test_hidden_names(database, ctfd_path):
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "hidden" WHERE id = 2')
+    db = database(f'sqlite:///{ctfd_path}')
+    assert db.names['challenges'].resolve('Challenge2') is None
+    assert 'Challenge Challenge2 does not exists. Did you mean Challenge1?' == \
+           asyncio.run(display_who_solved(db, 'Challenge2'))
+    assert 'Category Category2 does not exists. Did you mean Category1?' == \
+           asyncio.run(display_category(db, 'Category2'))
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "visible" WHERE id = 2')
+    asyncio.run(display_cron(db))  # the names are reloaded with the scoreboard
+    assert 'Challenge2' == db.names['challenges'].resolve('Challenge2')
+    assert 'Category2' == db.names['categories'].resolve('Category2')
+
+
+def test_renamed_names(database, ctfd_path):
+    db = database(f'sqlite:///{ctfd_path}')
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET name = "Renamed", category = "Web" WHERE id = 1')
+    asyncio.run(display_cron(db))
+    assert 'Renamed' == db.names['challenges'].resolve('Renamed')
+    assert db.names['challenges'].resolve('Challenge1') is None
+    assert 'Web' == db.names['categories'].resolve('web')
+    assert ' • zTeeed\n • user1\n' == asyncio.run(display_who_solved(db, 'Renamed'))
+
+
+def test_stale_names(database, ctfd_path):
+    db = database(f'sqlite:///{ctfd_path}')
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET name = "Renamed" WHERE id = 1')
+    # the names are not reloaded yet
+    assert 'Challenge1' == db.names['challenges'].resolve('Challenge1')
+    assert 'Challenge Challenge1 does not exists. Did you mean Challenge2?' == \
+           asyncio.run(display_who_solved(db, 'Challenge1'))
+    assert {} == db.cache.entries
+    assert 'Renamed' == db.names['challenges'].resolve('Renamed')  # reloaded by the miss
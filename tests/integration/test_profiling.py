@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+from bot.manage import database_data
+from bot.profiling import Profiler
+from db import Database
+
+
+def profile_query(db: Database, profiler: Profiler, name: str):
+    async def run():
+        with profiler.profile(name) as profiled:
+            await db.query(database_data.get_scoreboard, user_type='all')
+            await db.query(database_data.get_users, user_type='all')
+        return profiled
+
+    return asyncio.run(run())
+
+
+def test_profiling_sql(database, tmp_path, monkeypatch):
+    profiler = Profiler(mode='sql', directory=str(tmp_path), slowest=2)
+    monkeypatch.setattr('db.profiler', profiler)
+    db = database()
+    run = profile_query(db, profiler, 'scoreboard')
+    # statements executed in the executor threads are counted for the command
+    assert run.count >= 2
+    assert run.sql_duration > 0
+    assert not run.profiles
+    assert profiler.current.get() is None
+
+    for i in range(3):
+        profile_query(db, profiler, f'command {i}')
+    reports = os.listdir(str(tmp_path))
+    assert 2 == len(reports)  # only the slowest runs are kept
+    with open(os.path.join(str(tmp_path), reports[0])) as f:
+        assert 'SELECT' in f.read()
+
+
+def test_profiling_cprofile(database, tmp_path, monkeypatch):
+    profiler = Profiler(mode='cprofile', directory=str(tmp_path), slowest=1)
+    monkeypatch.setattr('db.profiler', profiler)
+    db = database()
+    run = profile_query(db, profiler, 'scoreboard')
+    assert 3 == len(run.profiles)  # event loop and the two queries
+    assert 'get_scoreboard' in run.report()
+    assert not profiler.profiling
+
+
+def test_profiling_disabled(tmp_path):
+    profiler = Profiler(mode=None, directory=str(tmp_path))
+    with profiler.profile('scoreboard') as run:
+        assert run is None
+    assert [] == os.listdir(str(tmp_path))
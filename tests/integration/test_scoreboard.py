@@ -0,0 +1,96 @@
+import sqlite3
+
+from sqlalchemy.orm import Session
+
+from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
+from bot.database.tables import CTFdTables
+from bot.manage.database_data import get_awards, get_banned_users, get_dynamic_challenges, get_dynamic_solves, \
+    load_scoreboard, get_scoreboard_state
+from bot.manage.scoreboard import Scoreboard, get_dynamic_value
+
+
+def test_load_scoreboard(session: Session, tables: CTFdTables):
+    scoreboard = load_scoreboard(session, tables, user_type='all')
+    assert ['zTeeed', 'user1', 'user2'] == scoreboard.get_users()
+    assert [{'username': 'zTeeed', 'score': 50}] == scoreboard.get_scoreboard(limit=1)
+    assert 1 == scoreboard.get_rank('user1')
+    assert 50 == scoreboard.get_score('user2')
+    assert scoreboard.get_rank('user42') is None
+
+
+def test_scoreboard_add_solve(session: Session, tables: CTFdTables):
+    scoreboard = load_scoreboard(session, tables, user_type='all')
+    assert scoreboard.add_solve(3, 'user2', 1, 50)
+    assert not scoreboard.add_solve(3, 'user2', 1, 50)  # already counted
+    assert scoreboard.add_solve(4, 'user3', 2, 50)
+    assert scoreboard.get_scoreboard() == [
+        {'username': 'user2', 'score': 100},
+        {'username': 'zTeeed', 'score': 50},
+        {'username': 'user1', 'score': 50},
+        {'username': 'user3', 'score': 50}
+    ]
+    assert 0 == scoreboard.get_rank('user2')
+    assert 3 == scoreboard.get_rank('user3')
+
+
+def test_banned_users(session: Session, tables: CTFdTables):
+    assert [] == get_banned_users(session, tables)
+
+
+def test_dynamic_value():
+    assert 500 == get_dynamic_value(500, 100, 20, 0)
+    assert 500 == get_dynamic_value(500, 100, 20, 1)
+    assert 499 == get_dynamic_value(500, 100, 20, 2)
+    assert 100 == get_dynamic_value(500, 100, 20, 21)
+    assert 100 == get_dynamic_value(500, 100, 20, 1000)
+
+
+def test_scoreboard_dynamic_awards():
+    scoreboard = Scoreboard()
+    scoreboard.load([(1, 'user1', 1, 500), (1, 'user1', 2, 50), (2, 'user2', 1, 500)],
+                    dynamic={1: (500, 100, 4)}, awards=[(2, 'user2', 60), (3, 'user3', 10)])
+    assert 475 == scoreboard.values[1]
+    assert scoreboard.get_scoreboard() == [
+        {'username': 'user2', 'score': 535},
+        {'username': 'user1', 'score': 525},
+        {'username': 'user3', 'score': 10}
+    ]
+    # third solve of the dynamic challenge: 475 -> 400 for every solver
+    assert scoreboard.add_solve(3, 'user3', 1, 500)
+    assert 400 == scoreboard.values[1]
+    assert scoreboard.get_scoreboard() == [
+        {'username': 'user2', 'score': 460},
+        {'username': 'user1', 'score': 450},
+        {'username': 'user3', 'score': 410}
+    ]
+
+
+def test_scoreboard_dynamic_counted():
+    scoreboard = Scoreboard()
+    # user9 is hidden or not ranked, its solve still lowers the value like in CTFd
+    scoreboard.load([(1, 'user1', 1, 500)], dynamic={1: (500, 100, 4)}, dynamic_solves=[(1, 1), (1, 9)])
+    assert 475 == scoreboard.values[1]
+    assert scoreboard.add_solve(8, 'user8', 1, 500, ranked=False)
+    assert 400 == scoreboard.values[1]
+    assert [{'username': 'user1', 'score': 400}] == scoreboard.get_scoreboard()
+    assert not scoreboard.add_solve(8, 'user8', 1, 500, ranked=False)  # already counted
+    assert not scoreboard.add_solve(7, 'user7', 1, 500, ranked=False, counted=False)  # hidden or banned
+
+
+def test_load_dynamic_solves(ctfd_path):
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('INSERT INTO dynamic_challenge (id, initial, minimum, decay) VALUES (1, 500, 100, 4)')
+    engine, base = get_sqlalchemy_engine(f'sqlite:///{ctfd_path}')
+    session, tables = get_sqlalchemy_session(engine), get_sqlalchemy_tables(base)
+    # the solve of the hidden admin zTeeed is not counted, whatever the ranked users
+    assert [(1, 2)] == get_dynamic_solves(session, tables)
+    for user_type in ('all', 'admin', 'user'):
+        assert 500 == load_scoreboard(session, tables, user_type=user_type).values[1]
+
+
+def test_scoreboard_state(session: Session, tables: CTFdTables):
+    assert {} == get_dynamic_challenges(session, tables)
+    assert [] == get_awards(session, tables, user_type='all')
+    # banned users, hidden users, awards, users names, visible challenges values and names, solves
+    assert (0, None, 1, 1, 0, None, 3, 16, 2, 100, 20, 18, 3) == get_scoreboard_state(session, tables)
+    assert 2 == get_scoreboard_state(session, tables, last_id=2)[-1]
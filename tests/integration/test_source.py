@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+import ctfd
+from bot.database.source import ChangeFeedSource, EventSource, PollingSource, append_event, get_event_source
+from bot.display.show import display_cron
+
+
+def test_polling_source():
+    source = PollingSource(interval=0.05)
+    start = time.perf_counter()
+    asyncio.run(source.wait())
+    assert time.perf_counter() - start >= 0.05
+    assert isinstance(get_event_source(), PollingSource)
+
+
+def test_change_feed(tmp_path):
+    path = str(tmp_path / 'feed.jsonl')
+    append_event(path, 'submissions', id=1, type='correct')  # written before the bot started
+    source = ChangeFeedSource(path, heartbeat=5, check=0.01)
+
+    async def run():
+        async def produce():
+            await asyncio.sleep(0.05)
+            append_event(path, 'submissions', id=2, type='correct')
+            append_event(path, 'challenges', id=3, state='visible')
+
+        start = time.perf_counter()
+        await asyncio.gather(source.wait(), produce())
+        return time.perf_counter() - start
+
+    # woken by the change, long before the heartbeat
+    assert asyncio.run(run()) < 1
+    assert [('submissions', 2), ('challenges', 3)] == [(event['table'], event['id']) for event in source.events]
+
+
+def test_change_feed_heartbeat(tmp_path):
+    path = str(tmp_path / 'feed.jsonl')
+    source = ChangeFeedSource(path, heartbeat=0.1, check=0.01)
+    asyncio.run(source.wait())
+    assert [] == source.events
+
+
+def test_change_feed_partial_line(tmp_path):
+    path = tmp_path / 'feed.jsonl'
+    path.write_text('')
+    source = ChangeFeedSource(str(path))
+    with open(path, 'a') as f:
+        f.write('{"table": "submissions", "id": 1}\n{"table": "subm')
+    assert [{'table': 'submissions', 'id': 1}] == source.read()
+    with open(path, 'a') as f:
+        f.write('issions", "id": 2}\n')
+    assert [{'table': 'submissions', 'id': 2}] == source.read()
+    path.write_text('{"table": "challenges", "id": 1}\n')  # rotated
+    assert [{'table': 'challenges', 'id': 1}] == source.read()
+
+
+def test_polling_backoff():
+    source = PollingSource(interval=1, min_interval=0.5, max_interval=4, backoff=2)
+    intervals = []
+    for activity in [False, False, False, False, True, False]:
+        source.update(activity)
+        intervals.append(source.get_interval())
+    assert [2, 4, 4, 4, 0.5, 1] == intervals
+
+
+def test_polling_closed():
+    source = PollingSource(interval=1, min_interval=0.5, closed_interval=300)
+    now = time.time()
+    source.period = (int(now) + 60, int(now) + 3600)
+    assert source.is_closed(now)
+    assert 60 >= source.get_interval(now) > 59  # wakes up at the start
+    assert 300 == source.get_interval(now - 3600)
+    assert 1 == source.get_interval(now + 600)
+    assert 300 == source.get_interval(now + 7200)  # over
+
+
+def test_cron_closed(database, ctfd_path):
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE config SET value = ? WHERE key = "start"', (str(int(time.time()) + 3600),))
+    db = database(f'sqlite:///{ctfd_path}')
+    db.last_id = 0
+    assert db.source.is_closed()
+    assert [] == asyncio.run(display_cron(db))
+    assert 0 == db.last_id  # nothing was read, solves are announced once the CTF starts
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE config SET value = NULL WHERE key = "start"')
+    assert asyncio.run(display_cron(db))
+    assert not db.source.is_closed()
+
+
+def test_watch_errors(monkeypatch):
+    monkeypatch.setattr(ctfd, 'CTFD_INSTANCES', {'first': dict(db_uri='sqlite:///ctfd.db', state_path=None),
+                                                 'second': dict(db_uri='sqlite:///ctfd.db', state_path=None)})
+    ticks = []
+
+    async def cron(_, db):
+        ticks.append(db.name)
+        if db.name == 'first':
+            raise sqlite3.OperationalError('database is locked')
+
+    async def wait():
+        await asyncio.sleep(0)
+
+    async def run():
+        bot = ctfd.CTFdBot()  # the discord client needs a running loop
+        bot.bot.channels = ['ctf-news']
+        monkeypatch.setattr(bot.bot, 'is_closed', lambda: len(ticks) >= 6)
+        for db in bot.bot.databases:
+            db.source.wait = wait
+        await asyncio.gather(*(bot.watch(db) for db in bot.bot.databases))
+        return bot.bot.databases.databases['first'].source
+
+    monkeypatch.setattr(ctfd.display, 'cron', cron)
+    source = asyncio.run(run())
+    assert 3 == ticks.count('second')  # still watched while the first instance fails
+    assert source.interval > PollingSource().interval  # backoff
+
+
+def test_event_source_abstract():
+    with pytest.raises(TypeError):
+        EventSource()
@@ -1,32 +1,22 @@
+import asyncio
 import datetime
+from types import SimpleNamespace
 from typing import Dict, List
 
 import pytest
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import Session
 
-from bot.database.sql import get_sqlalchemy_engine, get_sqlalchemy_session, get_sqlalchemy_tables
+from bot.database.sql import get_alembic_version, get_reflected_metadata, get_sqlalchemy_engine
 from bot.database.tables import CTFdTables
+from bot.display import show
+from bot.manage import database_data
 from bot.manage.database_data import get_ctf_name, get_false_submissions, get_visible_challenges, get_challenge_info, \
     get_scoreboard, get_users, get_categories, get_category_info, user_exists, challenge_exists, \
-    get_authors_challenge, get_users_solved_challenge, get_challenges_solved_during, challenges_solved_by_user, diff, \
-    track_user
-
-
-@pytest.fixture
-def db_uri() -> str:
-    return 'sqlite:///ctfd.db'
-
-
-@pytest.fixture
-def session(db_uri: str) -> Session:
-    engine, base = get_sqlalchemy_engine(db_uri)
-    return get_sqlalchemy_session(engine)
-
-
-@pytest.fixture
-def tables(db_uri: str) -> CTFdTables:
-    engine, base = get_sqlalchemy_engine(db_uri)
-    return get_sqlalchemy_tables(base)
+    get_authors_challenge, parse_authors, get_users_solved_challenge, get_challenges_solved_during, \
+    challenges_solved_by_user, diff, track_user, get_new_challenges, get_fingerprint
+from bot.manage.discord_data import MemberIndex
+from db import Databases
 
 
 @pytest.fixture()
@@ -107,8 +97,27 @@ def test_tables(db_uri: str, tables_name: List[str]):
     assert tables_name == engine.table_names()
 
 
-def test_columns(db_uri: str, tables_name: List[str], columns: Dict):
+def test_pinned_models(db_uri: str, tables_name: List[str], columns: Dict):
     engine, base = get_sqlalchemy_engine(db_uri)
+    engine, reflected = get_sqlalchemy_engine(db_uri, reflect=True)
+    for table_name in base.metadata.tables:
+        assert table_name in tables_name
+        cols = [column.key for column in base.metadata.tables[table_name].columns]
+        assert cols == [column.key for column in reflected.metadata.tables[table_name].columns]
+
+
+def test_schema_cache(db_uri: str, tmp_path):
+    engine = create_engine(db_uri)
+    version = get_alembic_version(engine)
+    assert get_reflected_metadata(engine, db_uri, 'unknown', str(tmp_path)) is not None
+    assert len(list(tmp_path.iterdir())) == 1
+    metadata = get_reflected_metadata(engine, db_uri, 'unknown', str(tmp_path))
+    assert 'users' in metadata.tables
+    assert version is not None
+
+
+def test_columns(db_uri: str, tables_name: List[str], columns: Dict):
+    engine, base = get_sqlalchemy_engine(db_uri, reflect=True)
     for table_name in tables_name:
         table = getattr(base.classes, table_name, None)
         cols = [f'{table_name}.{column.key}' for column in table.__table__.columns]
@@ -135,6 +144,16 @@ def test_challenge_info(session: Session, tables: CTFdTables):
     assert get_challenge_info(session, tables, 3) is None
 
 
+def test_visible_challenges_fingerprint(session: Session, tables: CTFdTables):
+    assert get_fingerprint([1, 2]) == database_data.get_visible_challenges_fingerprint(session, tables)
+    assert get_fingerprint([2, 1]) == get_fingerprint([1, 2])
+    assert get_fingerprint([1, 4]) != get_fingerprint([2, 3])
+    # same count, sum and sum of squares of the ids
+    assert get_fingerprint([1, 5, 6]) != get_fingerprint([2, 3, 7])
+    assert {2: ('Challenge2', 50, 'Category2')} == database_data.get_challenges_info(session, tables, [2, 3])
+    assert {} == database_data.get_challenges_info(session, tables, [])
+
+
 def test_scoreboard_user(session: Session, tables: CTFdTables):
     scoreboard = get_scoreboard(session, tables, user_type='user')
     assert [{'username': 'user1', 'score': 50}, {'username': 'user2', 'score': 50}] == scoreboard
@@ -193,6 +212,14 @@ def test_authors_challenge(session: Session, tables: CTFdTables):
     assert [] == get_authors_challenge(session, tables, 'Challenge42')
 
 
+def test_parse_authors():
+    assert (('SymLiNK', '2835'), ('zTeeed', '1234')) == parse_authors('By @SymLiNK#2835 and @zTeeed#1234')
+    assert (('SymLiNK', '2835'),) == parse_authors('Made by SymLiNK#2835')
+    hits = parse_authors.cache_info().hits
+    parse_authors('Made by SymLiNK#2835')
+    assert hits + 1 == parse_authors.cache_info().hits
+
+
 def test_users_solved_challenge(session: Session, tables: CTFdTables):
     assert ['user1'] == get_users_solved_challenge(session, tables, 'Challenge1', user_type='user')
     assert ['zTeeed'] == get_users_solved_challenge(session, tables, 'Challenge1', user_type='admin')
@@ -308,3 +335,100 @@ def test_track_user(session, tables):
     assert [] == track_user(session, tables, 'user42', user_type='user')
     assert [] == track_user(session, tables, 'user42', user_type='admin')
     assert [] == track_user(session, tables, 'user42', user_type='all')
+
+
+def test_new_challenges(session, tables):
+    assert (4, [], []) == get_new_challenges(session, tables, None, user_type='all')
+    assert (4, [], []) == get_new_challenges(session, tables, 4, user_type='all')
+
+    last_id, challenges, gaps = get_new_challenges(session, tables, 0, user_type='all')
+    assert 4 == last_id and [] == gaps
+    assert [(2, 'Challenge1'), (3, 'Challenge2'), (1, 'Challenge1')] == \
+           [(item['user_id'], item['challenge']) for item in challenges]
+
+    last_id, challenges, _ = get_new_challenges(session, tables, 1, user_type='user')
+    assert 4 == last_id
+    assert [{'user_id': 3, 'username': 'user2', 'member': 'user2', 'challenge_id': 2, 'challenge': 'Challenge2',
+             'value': 50, 'date': datetime.datetime(2019, 8, 15, 18, 48, 8, 785247), 'ranked': True,
+             'counted': True}] == challenges
+
+    assert (4, [], []) == get_new_challenges(session, tables, 3, user_type='admin')
+
+    # submission 2 was missing when submission 4 was read
+    last_id, challenges, gaps = get_new_challenges(session, tables, 4, user_type='all', gaps=[2])
+    assert [2] == [item['challenge_id'] for item in challenges]
+    assert (4, []) == (last_id, gaps)
+
+
+def test_database_query(database):
+    db = database()
+
+    async def run():
+        return await asyncio.gather(
+            db.query(database_data.get_scoreboard, user_type='all'),
+            db.query(database_data.get_users_solved_challenge, 'Challenge1', user_type='all'),
+            db.query(database_data.get_new_challenges, None, user_type='all')
+        )
+
+    scoreboard, users, new_challenges = asyncio.run(run())
+    assert ['zTeeed', 'user1', 'user2'] == [item['username'] for item in scoreboard]
+    assert ['zTeeed', 'user1'] == users
+    assert (4, [], []) == new_challenges
+
+
+class Channel:
+
+    def __init__(self, guild: str, name: str) -> None:
+        self.guild, self.name = guild, name
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def test_database_sessions(database):
+    db = database()
+    connections = []
+    event.listen(db.engine, 'checkout', lambda *args: connections.append(1))
+    event.listen(db.engine, 'checkin', lambda *args: connections.pop())
+    for _ in range(10):
+        db.execute(database_data.get_challenges_solved, user_type='all')
+        asyncio.run(db.query(database_data.get_scoreboard, user_type='all'))
+        # sessions and their identity map are released after every operation
+        assert not db.sessions.registry.has()
+        assert not connections
+
+
+def test_command_statements(database):
+    db = database()
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    context = SimpleNamespace(bot=SimpleNamespace(members=MemberIndex(), emojis=[]),
+                              message=SimpleNamespace(guild=SimpleNamespace(id=1)))
+
+    # existence, rank and solves of every command are known from a single statement
+    commands = [
+        (show.display_diff(db, 'user1', 'user2'), [{'user': 'user1', 'msg': ' • Challenge1 (50 points)'},
+                                                   {'user': 'user2', 'msg': ' • Challenge2 (50 points)'}]),
+        (show.display_who_solved(db, 'Challenge1'), ' • zTeeed\n • user1\n'),
+        (show.display_category(db, 'Category1'), ' • Challenge1 (50 points) \n'),
+        (show.display_problem(db, context, 'Challenge1'), 'Cannot find authors for challenge "Challenge1".'),
+        (show.display_last_days(db, 99999, 'user2'),
+         [{'user': 'user2', 'msg': ' • Challenge2 (50 points) - 2019-08-15 18:48:08.785247\n'}])
+    ]
+    for command, expected in commands:
+        statements.clear()
+        assert expected == asyncio.run(command)
+        assert 1 == len(statements)
+
+
+def test_databases(db_uri: str):
+    databases = Databases({
+        'first': dict(db_uri=db_uri, channels=['ctf-news'], state_path=None),
+        'second': dict(db_uri=db_uri, channels=['Community/second-ctf'], state_path=None)
+    })
+    assert ['first', 'second'] == [db.name for db in databases]
+    assert 'second' == databases.get(Channel('Community', 'second-ctf')).name
+    assert 'first' == databases.get(Channel('Other', 'ctf-news')).name
+    assert databases.get(Channel('Other', 'second-ctf')) is None
+    for db in databases:
+        db.executor.shutdown()
@@ -0,0 +1,145 @@
+import asyncio
+import sqlite3
+
+from bot.constants import SCOREBOARD_RELOAD
+from bot.database.state import State
+from bot.display.show import display_cron
+
+
+def test_state(tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = State(path)
+    assert state.get('last_id') is None
+    state.set('last_id', 42)
+    state.set('challenges', [1, 2])
+    state.close()
+
+    state = State(path)
+    assert 42 == state.get('last_id')
+    assert [1, 2] == state.get('challenges')
+
+
+def test_restart_catch_up(database, tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = State(path, namespace='default')
+    state.set('last_id', 1)  # bot stopped after the first solve
+    state.set('challenges', [1])  # Challenge2 was published while the bot was down
+    state.close()
+
+    db = database(state_path=path)
+    to_send_list = asyncio.run(display_cron(db))
+    names = [name for (name, _, _) in to_send_list]
+    # the challenge published while the bot was down is announced before its solves, in the same tick
+    assert ['New challenge available', 'New challenge solved by user2', 'New challenge solved by zTeeed'] == names
+    assert (' • Challenge2 (50 points) - Category2', 0x16B841) == to_send_list[0][1:]
+    assert 4 == db.last_id
+    assert [] == asyncio.run(display_cron(db))
+
+    asyncio.run(db.save_state())
+    state = State(path, namespace='default')
+    assert 4 == state.get('last_id')
+    assert [1, 2] == state.get('challenges')
+
+
+def test_challenges_visibility(database, ctfd_path):
+    db = database(f'sqlite:///{ctfd_path}')
+    assert [] == asyncio.run(display_cron(db))
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "hidden" WHERE id = 2')
+    assert [('Challenge no longer available', ' • Challenge2 (50 points) - Category2', 0x99AAB5)] == \
+        asyncio.run(display_cron(db))
+    assert {1} == db.challenges
+    assert 'user2' not in [user['username'] for user in db.scoreboard.get_scoreboard() if user['score']]
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "visible" WHERE id = 2')
+    assert [('New challenge available', ' • Challenge2 (50 points) - Category2', 0x16B841)] == \
+        asyncio.run(display_cron(db))
+    assert {1, 2} == db.challenges
+    assert [] == asyncio.run(display_cron(db))
+
+
+def test_late_commit(database, ctfd_path, tmp_path):
+    with sqlite3.connect(ctfd_path) as connection:
+        submission = connection.execute('SELECT * FROM submissions WHERE id = 2').fetchone()
+        connection.execute('DELETE FROM submissions WHERE id = 2')  # not committed yet by its CTFd worker
+    db = database(f'sqlite:///{ctfd_path}', state_path=str(tmp_path / 'state.db'))
+    db.last_id = 0
+    assert ['New challenge solved by user1', 'New challenge solved by zTeeed'] == \
+        [name for (name, _, _) in asyncio.run(display_cron(db))]
+    assert (4, [2]) == (db.last_id, db.gaps)
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute(f'INSERT INTO submissions VALUES ({", ".join("?" * len(submission))})', submission)
+    assert ['New challenge solved by user2'] == [name for (name, _, _) in asyncio.run(display_cron(db))]
+    assert (4, []) == (db.last_id, db.gaps)
+    assert [] == asyncio.run(display_cron(db))
+
+
+def test_database_replaced(database, tmp_path):
+    path = str(tmp_path / 'state.db')
+    state = State(path, namespace='default')
+    state.set('last_id', 42)  # state of a former CTFd database
+    state.set('challenges', [1, 5])
+    state.close()
+
+    db = database(state_path=path)
+    assert (4, {1, 2}) == (db.last_id, db.challenges)
+    assert [] == asyncio.run(display_cron(db))
+
+
+def test_shared_state(database, tmp_path):
+    path = str(tmp_path / 'state.db')
+    first = database(state_path=path, name='first')
+    second = database(state_path=path, name='second')
+    first.last_id, second.last_id = 3, 4
+    first.write_state()
+    second.write_state()
+    assert (3, 4) == (State(path, namespace='first').get('last_id'), State(path, namespace='second').get('last_id'))
+    assert 3 == database(state_path=path, name='first').last_id
+
+
+def test_scoreboard_edits(database, ctfd_path):
+    db = database(f'sqlite:///{ctfd_path}')
+
+    def scores():
+        return {user['username']: user['score'] for user in db.scoreboard.get_scoreboard()}
+
+    assert {'zTeeed': 50, 'user1': 50, 'user2': 50} == scores()
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET value = 500 WHERE id = 1')
+    assert [] == asyncio.run(display_cron(db))
+    assert {'zTeeed': 500, 'user1': 500, 'user2': 50} == scores()
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('DELETE FROM solves WHERE id = 1')
+        connection.execute('UPDATE users SET name = "user3" WHERE name = "user2"')
+    asyncio.run(display_cron(db))
+    assert 'user3' in scores() and 'user2' not in scores()
+    assert 1 == sum(1 for score in scores().values() if score == 500)
+
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE users SET name = "user4" WHERE name = "user3"')  # same length, same state
+    asyncio.run(display_cron(db))
+    assert 'user3' in scores()
+    db.scoreboard_loaded -= SCOREBOARD_RELOAD
+    asyncio.run(display_cron(db))
+    assert 'user4' in scores()
+
+
+def test_changes_during_solves(database, ctfd_path):
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "hidden" WHERE id = 2')
+    db = database(f'sqlite:///{ctfd_path}')
+    db.last_id = 0  # every solve is announced by the next tick
+    with sqlite3.connect(ctfd_path) as connection:
+        connection.execute('UPDATE challenges SET state = "visible" WHERE id = 2')
+        connection.execute('UPDATE users SET banned = 1 WHERE name = "user1"')
+    names = [name for (name, _, _) in asyncio.run(display_cron(db))]
+    assert 'New challenge available' == names[0]  # before its solves
+    assert 'New challenge solved by user2' in names
+    assert {1, 2} == db.challenges
+    scores = {user['username']: user['score'] for user in db.scoreboard.get_scoreboard()}
+    assert 50 == scores['user2']
+    assert 'user1' not in scores
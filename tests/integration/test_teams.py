@@ -0,0 +1,72 @@
+import asyncio
+import sqlite3
+from typing import Iterator
+
+import pytest
+
+from bot.display.show import display_cron, display_who_solved
+from bot.manage import database_data
+from dataset import build_database
+from db import Database
+
+
+@pytest.fixture(scope='module')
+def db(tmp_path_factory) -> Iterator[Database]:
+    # 4 teams of 3 players (bench_team100 = bench100, bench104, bench108), each player solving 3 of 12 challenges
+    path = tmp_path_factory.mktemp('teams') / 'teams.db'
+    db = Database(build_database(str(path), users=12, teams=4, challenges=12, solves_per_user=3, tracking_per_user=1),
+                  mode='teams')
+    yield db
+    db.executor.shutdown()
+    db.state_executor.shutdown()
+
+
+def get_scores(db: Database):
+    with sqlite3.connect(db.engine.url.database) as connection:
+        return dict(connection.execute('SELECT teams.name, SUM(challenges.value) FROM solves '
+                                       'JOIN teams ON teams.id = solves.team_id '
+                                       'JOIN challenges ON challenges.id = solves.challenge_id GROUP BY teams.id'))
+
+
+def test_team_scoreboard(db: Database):
+    scoreboard = db.execute(database_data.get_scoreboard, user_type='all')
+    assert get_scores(db) == {team['username']: team['score'] for team in scoreboard}
+    assert [team['username'] for team in scoreboard] == db.scoreboard.get_users()
+
+
+def test_team_members(db: Database):
+    assert 4 == len(db.team_members)
+    assert ['bench100', 'bench104', 'bench108'] == db.team_members['bench_team100']
+
+
+def test_team_who_solved(db: Database):
+    teams = db.execute(database_data.get_users_solved_challenge, 'bench100', user_type='all')
+    assert {'bench_team100', 'bench_team102', 'bench_team103'} == set(teams)
+    to_send = asyncio.run(display_who_solved(db, 'bench100'))
+    assert ' • bench_team100 (bench100, bench104, bench108)' in to_send.split('\n')
+
+
+def test_team_diff(db: Database):
+    diff1, diff2 = db.execute(database_data.diff, 'bench_team100', 'bench_team101', user_type='all')
+    assert ['bench100', 'bench104', 'bench108'] == sorted(challenge['name'] for challenge in diff1)
+    assert ['bench103', 'bench107', 'bench111'] == sorted(challenge['name'] for challenge in diff2)
+
+
+def test_team_users(db: Database):
+    assert 3 == len(db.execute(database_data.track_user, 'bench_team100', user_type='all'))  # one ip per member
+    assert db.execute(database_data.user_exists, 'bench_team100', user_type='user')
+    assert not db.execute(database_data.user_exists, 'bench_team100', user_type='admin')
+    assert not db.execute(database_data.user_exists, 'bench100', user_type='all')
+
+
+def test_team_cron(db: Database):
+    submission_id = db.last_id + 1
+    with sqlite3.connect(db.engine.url.database) as connection:
+        connection.execute('INSERT INTO submissions (id, challenge_id, user_id, team_id, ip, provided, type, date) '
+                           'VALUES (?, 100, 105, 101, "127.0.0.1", "flag", "correct", "2020-01-01 00:00:00")',
+                           (submission_id,))
+        connection.execute('INSERT INTO solves (id, challenge_id, user_id, team_id) VALUES (?, 100, 105, 101)',
+                           (submission_id,))
+    to_send_list = asyncio.run(display_cron(db))
+    assert ['New challenge solved by bench_team101 (bench105)'] == [name for (name, _, _) in to_send_list]
+    assert get_scores(db)['bench_team101'] == db.scoreboard.get_score('bench_team101')